@@ -1,17 +1,185 @@
 import frappe
+from frappe.utils import add_days, cint, now_datetime
+
+APPROVAL_TODO_PREFIX = "Approval required for "
+
+DEFAULT_RETENTION_DAYS = 90
+
+# Closed approval ToDos deleted per statement, small enough not to hold long locks
+DELETE_CHUNK_SIZE = 1000
+
 
 def create_todo_for_approval(doc, method):
-    if doc.status == "Open":
-        if not frappe.db.exists("ToDo", {
-            "reference_type": doc.reference_doctype,
-            "reference_name": doc.reference_name,
-            "owner": doc.user
-        }):
-            frappe.get_doc({
-                "doctype": "ToDo",
-                "description": f"Approval required for {doc.reference_doctype} {doc.reference_name}",
-                "reference_type": doc.reference_doctype,
-                "reference_name": doc.reference_name,
-                "assigned_by": frappe.session.user,
-                "owner": doc.user
-            }).insert(ignore_permissions=True)
+	"""
+	Queue an approval ToDo for the Workflow Action's user. ToDos queued in one
+	transaction are written together just before it commits, so a bulk workflow
+	transition costs one lookup and one insert instead of one per action.
+	"""
+	if doc.status == "Open":
+		pending = frappe.flags.pending_approval_todos
+		if pending is None:
+			pending = frappe.flags.pending_approval_todos = {}
+			frappe.db.before_commit.add(flush_approval_todos)
+			frappe.db.after_rollback.add(discard_approval_todos)
+
+		# Same document and approver twice in one batch is one ToDo
+		entry = pending.setdefault(
+			(doc.reference_doctype, doc.reference_name, doc.user), (frappe.session.user, set())
+		)
+		entry[1].add(doc.name)
+
+
+def flush_approval_todos():
+	pending = frappe.flags.pop("pending_approval_todos", None)
+	if not pending:
+		return
+
+	# Actions undone by a savepoint rollback, or closed again before the commit,
+	# get no ToDo; savepoint rollbacks never reach discard_approval_todos
+	open_actions = set(
+		frappe.db.sql_list(
+			"select name from `tabWorkflow Action` where name in %(actions)s and status = 'Open'",
+			{"actions": tuple(action for _, actions in pending.values() for action in actions)},
+		)
+	)
+	pending = {key: assigned_by for key, (assigned_by, actions) in pending.items() if actions & open_actions}
+	if not pending:
+		return
+
+	existing = set(
+		frappe.db.sql(
+			"""
+        select reference_type, reference_name, owner
+        from `tabToDo`
+        where reference_type in %(reference_types)s
+            and reference_name in %(reference_names)s
+            and owner in %(users)s
+        """,
+			{
+				"reference_types": tuple({key[0] for key in pending}),
+				"reference_names": tuple({key[1] for key in pending}),
+				"users": tuple({key[2] for key in pending}),
+			},
+		)
+	)
+
+	now = now_datetime()
+	values = [
+		[
+			frappe.generate_hash(length=10),
+			user,
+			assigned_by,
+			now,
+			now,
+			"Open",
+			"Medium",
+			f"{APPROVAL_TODO_PREFIX}{reference_doctype} {reference_name}",
+			reference_doctype,
+			reference_name,
+			assigned_by,
+		]
+		for (reference_doctype, reference_name, user), assigned_by in pending.items()
+		if (reference_doctype, reference_name, user) not in existing
+	]
+
+	if values:
+		frappe.db.bulk_insert(
+			"ToDo",
+			[
+				"name",
+				"owner",
+				"modified_by",
+				"creation",
+				"modified",
+				"status",
+				"priority",
+				"description",
+				"reference_type",
+				"reference_name",
+				"assigned_by",
+			],
+			values,
+		)
+
+
+def discard_approval_todos():
+	frappe.flags.pop("pending_approval_todos", None)
+
+
+def close_todo_for_approval(doc, method):
+	"""
+	Close the approval ToDo of a Workflow Action that is no longer open
+	"""
+	if doc.status == "Open" or not doc.has_value_changed("status"):
+		return
+
+	frappe.db.sql(
+		"""
+        update `tabToDo`
+        set status = 'Closed', modified = %(now)s
+        where reference_type = %(reference_type)s
+            and reference_name = %(reference_name)s
+            and owner = %(user)s
+            and status = 'Open'
+            and description like %(prefix)s
+        """,
+		{
+			"now": now_datetime(),
+			"reference_type": doc.reference_doctype,
+			"reference_name": doc.reference_name,
+			"user": doc.user,
+			"prefix": f"{APPROVAL_TODO_PREFIX}%",
+		},
+	)
+
+
+def close_stale_approval_todos():
+	"""
+	Hourly job closing, in one statement, open approval ToDos whose approver has
+	no open Workflow Action on the document any more. Workflow actions completed
+	or cleared by the workflow engine are updated in SQL and never reach
+	close_todo_for_approval.
+	"""
+	frappe.db.sql(
+		"""
+        update `tabToDo` todo
+        set todo.status = 'Closed', todo.modified = %(now)s
+        where todo.status = 'Open'
+            and todo.description like %(prefix)s
+            and not exists (
+                select 1 from `tabWorkflow Action` wa
+                where wa.reference_doctype = todo.reference_type
+                    and wa.reference_name = todo.reference_name
+                    and wa.user = todo.owner
+                    and wa.status = 'Open'
+            )
+        """,
+		{"now": now_datetime(), "prefix": f"{APPROVAL_TODO_PREFIX}%"},
+	)
+
+
+def delete_closed_approval_todos():
+	"""
+	Daily job deleting closed approval ToDos older than the retention window,
+	DELETE_CHUNK_SIZE rows per transaction so the ToDo table is never locked for long
+	"""
+	retention_days = (
+		cint(frappe.db.get_single_value("Dsi Erp Settings", "approval_todo_retention_days"))
+		or DEFAULT_RETENTION_DAYS
+	)
+	cutoff = add_days(now_datetime(), -retention_days)
+
+	while True:
+		names = frappe.db.sql_list(
+			"""
+            select name from `tabToDo`
+            where status = 'Closed' and modified < %(cutoff)s and description like %(prefix)s
+            limit %(limit)s
+            """,
+			{"cutoff": cutoff, "prefix": f"{APPROVAL_TODO_PREFIX}%", "limit": DELETE_CHUNK_SIZE},
+		)
+		if not names:
+			break
+
+		frappe.db.delete("ToDo", {"name": ["in", names]})
+		frappe.db.commit()
@@ -0,0 +1,46 @@
+import click
+import frappe
+from frappe.commands import get_site, pass_context
+
+
+@click.command("backfill-renewable-documents")
+@click.option("--chunk-size", default=500, type=int, help="Employees synced per background job")
+@click.option(
+	"--restart", is_flag=True, default=False, help="Start over instead of resuming the unfinished backfill"
+)
+@click.option("--status", is_flag=True, default=False, help="Only show the progress of the latest backfill")
+@pass_context
+def backfill_renewable_documents(context, chunk_size=500, restart=False, status=False):
+	"""Re-sync Renewable Documents of all employees in chunked, resumable background jobs"""
+	from dsi_erp.dsi_erp.doctype.renewable_document_backfill.renewable_document_backfill import (
+		start_backfill,
+	)
+
+	site = get_site(context)
+	frappe.init(site=site)
+	frappe.connect()
+	try:
+		if status:
+			name = frappe.db.get_value("Renewable Document Backfill", {}, "name", order_by="creation desc")
+		else:
+			name = start_backfill(chunk_size=chunk_size, restart=restart)
+
+		if not name:
+			click.echo("No backfill has been run yet")
+			return
+
+		backfill = frappe.db.get_value(
+			"Renewable Document Backfill",
+			name,
+			["status", "processed_employees", "total_employees", "throughput"],
+			as_dict=True,
+		)
+		click.echo(
+			f"{name}: {backfill.status}, {backfill.processed_employees}/{backfill.total_employees} employees"
+			f" synced ({backfill.throughput or 0} employees/s)"
+		)
+	finally:
+		frappe.destroy()
+
+
+commands = [backfill_renewable_documents]
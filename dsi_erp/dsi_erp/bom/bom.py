@@ -0,0 +1,205 @@
+import frappe
+from frappe.utils import flt
+
+from dsi_erp.dsi_erp.quotation.quotation import clear_bom_rate_cache
+
+# BOMs recomputed per statement and transaction by the background job
+BOM_RECOMPUTE_CHUNK_SIZE = 500
+
+# BOM conversion rate in SQL, an unset rate counts as 1 like in erpnext
+CONVERSION_RATE = "ifnull(nullif(bom.conversion_rate, 0), 1)"
+
+# Operation fields copied onto BOM Operation rows through fetch_from. The
+# operation time is only a default there and is edited per BOM, so it stays.
+FETCHED_OPERATION_FIELDS = {
+	"custom_operation_type": "custom_operation_type",
+	"custom_daily_operation_hours": "custom_daily_operation_hours",
+}
+
+
+def set_operation_time_and_rate(doc, method=None):
+	"""
+	before_validate: derive time_in_mins and hour_rate of every operation costed
+	in days from its days and daily rate, so erpnext's costing in validate uses
+	them. Rows left without an hour_rate get the workstation's from erpnext;
+	operations without days keep erpnext's own time and rate.
+	"""
+	for row in doc.get("operations") or []:
+		if not is_costed_in_days(row):
+			continue
+
+		daily_hours = flt(row.custom_daily_operation_hours)
+		row.time_in_mins = flt(row.custom_operation_time) * daily_hours * 60
+		row.hour_rate = flt(row.custom_daily_rate) / daily_hours
+
+
+def is_costed_in_days(row):
+	return bool(flt(row.custom_operation_time) and flt(row.custom_daily_operation_hours))
+
+
+def set_labour_equipment_and_net_cost(doc, method=None):
+	"""
+	validate: runs after erpnext has costed the operations and set total_cost
+	"""
+	labour_cost = equipment_cost = 0
+	for row in doc.get("operations") or []:
+		if row.custom_operation_type == "Manpower":
+			labour_cost += flt(row.base_operating_cost)
+		elif row.custom_operation_type == "Equipment":
+			equipment_cost += flt(row.base_operating_cost)
+
+	doc.custom_labour_cost = labour_cost
+	doc.custom_equipment_cost = equipment_cost
+	doc.custom_net_cost = get_net_cost(doc.total_cost, doc.custom_profit_percentage)
+
+
+def get_net_cost(total_cost, profit_percentage):
+	return flt(total_cost) * (1 + flt(profit_percentage) / 100)
+
+
+def on_operation_update(doc, method=None):
+	"""
+	Copy changed Operation defaults onto the BOM Operation rows of active BOMs
+	and queue the recompute of those BOMs
+	"""
+	changed = {
+		row_field: doc.get(operation_field)
+		for row_field, operation_field in FETCHED_OPERATION_FIELDS.items()
+		if doc.has_value_changed(operation_field)
+	}
+	if not changed:
+		return
+
+	boms = frappe.db.sql_list(
+		"""
+        select distinct op.parent
+        from `tabBOM Operation` op
+        join `tabBOM` bom on bom.name = op.parent
+        where op.parenttype = 'BOM' and op.operation = %s
+            and bom.is_active = 1 and bom.docstatus < 2
+        """,
+		doc.name,
+	)
+	if not boms:
+		return
+
+	frappe.db.set_value(
+		"BOM Operation",
+		{"operation": doc.name, "parenttype": "BOM", "parent": ["in", boms]},
+		changed,
+		update_modified=False,
+	)
+	enqueue_bom_operation_cost_update(boms)
+
+
+@frappe.whitelist()
+def update_all_bom_operation_costs():
+	"""
+	Queue the recompute of every active BOM, e.g. after daily rates were revised
+	"""
+	frappe.only_for("System Manager")
+	return enqueue_bom_operation_cost_update()
+
+
+def enqueue_bom_operation_cost_update(boms=None):
+	job = frappe.enqueue(
+		"dsi_erp.dsi_erp.bom.bom.recompute_bom_operation_costs",
+		queue="long",
+		enqueue_after_commit=True,
+		job_id="recompute_bom_operation_costs" if boms is None else None,
+		deduplicate=boms is None,
+		boms=boms,
+	)
+	return job.id if job else None
+
+
+def recompute_bom_operation_costs(boms=None):
+	"""
+	Background job recomputing operation rows, labour and equipment cost, total
+	and net cost of active BOMs, all active BOMs when boms is None. Each chunk
+	of BOMs is two UPDATE statements, the same arithmetic as the validate hooks
+	done set-wise in the database.
+	"""
+	if boms is None:
+		boms = frappe.get_all(
+			"BOM", filters={"is_active": 1, "docstatus": ["<", 2]}, pluck="name", order_by="name"
+		)
+
+	for start in range(0, len(boms), BOM_RECOMPUTE_CHUNK_SIZE):
+		chunk = tuple(boms[start : start + BOM_RECOMPUTE_CHUNK_SIZE])
+		update_operation_rows(chunk)
+		update_bom_totals(chunk)
+		frappe.db.commit()
+
+	clear_bom_rate_cache()
+
+	# BOMs using these as sub-assemblies take the new costs through the rollup
+	frappe.enqueue("dsi_erp.dsi_erp.bom.cost_rollup.rollup_bom_costs", queue="long", boms=boms)
+	return len(boms)
+
+
+def update_operation_rows(boms):
+	# Each assignment is written out from the source columns, a multi-table
+	# UPDATE does not guarantee the order columns are assigned in.
+	# Only rows costed in days are touched, see is_costed_in_days. Like erpnext's
+	# update_rate_and_time, a row without a daily rate costs at its workstation's
+	# hour rate, and the cost per unit is per batch.
+	hour_rate = f"""
+        if(ifnull(op.custom_daily_rate, 0) != 0,
+            op.custom_daily_rate / op.custom_daily_operation_hours,
+            ifnull(ws.hour_rate, 0) / {CONVERSION_RATE})
+    """
+	time_in_mins = "op.custom_operation_time * op.custom_daily_operation_hours * 60"
+	operating_cost = f"({hour_rate}) * {time_in_mins} / 60"
+	batch_size = "ifnull(nullif(op.batch_size, 0), 1)"
+
+	frappe.db.sql(
+		f"""
+        update `tabBOM Operation` op
+        join `tabBOM` bom on bom.name = op.parent
+        left join `tabWorkstation` ws on ws.name = op.workstation
+        set
+            op.time_in_mins = {time_in_mins},
+            op.hour_rate = {hour_rate},
+            op.base_hour_rate = ({hour_rate}) * {CONVERSION_RATE},
+            op.operating_cost = {operating_cost},
+            op.base_operating_cost = {operating_cost} * {CONVERSION_RATE},
+            op.cost_per_unit = {operating_cost} / {batch_size},
+            op.base_cost_per_unit = {operating_cost} * {CONVERSION_RATE} / {batch_size}
+        where op.parenttype = 'BOM' and op.parent in %(boms)s
+            and ifnull(op.custom_operation_time, 0) != 0 and ifnull(op.custom_daily_operation_hours, 0) != 0
+            and bom.with_operations = 1 and ifnull(bom.fg_based_operating_cost, 0) = 0
+        """,
+		{"boms": boms},
+	)
+
+
+def update_bom_totals(boms):
+	frappe.db.sql(
+		"""
+        update `tabBOM` bom
+        join (
+            select
+                b.name,
+                ifnull(sum(op.operating_cost), 0) as operating_cost,
+                ifnull(sum(op.base_operating_cost), 0) as base_operating_cost,
+                ifnull(sum(if(op.custom_operation_type = 'Manpower', op.base_operating_cost, 0)), 0) as labour_cost,
+                ifnull(sum(if(op.custom_operation_type = 'Equipment', op.base_operating_cost, 0)), 0) as equipment_cost
+            from `tabBOM` b
+            left join `tabBOM Operation` op on op.parent = b.name and op.parenttype = 'BOM'
+            where b.name in %(boms)s and b.with_operations = 1 and ifnull(b.fg_based_operating_cost, 0) = 0
+            group by b.name
+        ) costs on costs.name = bom.name
+        set
+            bom.operating_cost = costs.operating_cost,
+            bom.base_operating_cost = costs.base_operating_cost,
+            bom.custom_labour_cost = costs.labour_cost,
+            bom.custom_equipment_cost = costs.equipment_cost,
+            bom.total_cost = costs.operating_cost + ifnull(bom.raw_material_cost, 0) - ifnull(bom.scrap_material_cost, 0),
+            bom.base_total_cost = costs.base_operating_cost + ifnull(bom.base_raw_material_cost, 0)
+                - ifnull(bom.base_scrap_material_cost, 0),
+            bom.custom_net_cost = (costs.operating_cost + ifnull(bom.raw_material_cost, 0) - ifnull(bom.scrap_material_cost, 0))
+                * (1 + ifnull(bom.custom_profit_percentage, 0) / 100)
+        """,
+		{"boms": boms},
+	)
@@ -0,0 +1,390 @@
+import frappe
+from frappe import _
+from frappe.utils import flt
+
+from dsi_erp.dsi_erp.bom.bom import get_net_cost
+from dsi_erp.dsi_erp.quotation.quotation import clear_bom_rate_cache
+
+# Cache sets of the items and BOMs waiting for the next rollup
+PENDING_ITEMS_KEY = "dsi_erp:bom_rollup_pending_items"
+PENDING_BOMS_KEY = "dsi_erp:bom_rollup_pending_boms"
+
+# Set while a rollup of the pending sets is queued or running. It expires so a
+# killed job cannot keep the pending sets from ever being rolled up.
+ROLLUP_SCHEDULED_KEY = "dsi_erp:bom_rollup_scheduled"
+ROLLUP_SCHEDULED_SECONDS = 60 * 60
+
+
+def on_item_price_change(doc, method=None):
+	"""
+	A buying price feeds the raw material cost of every BOM using the item
+	"""
+	if doc.buying and doc.item_code:
+		queue_bom_cost_rollup("items", doc.item_code)
+
+
+def on_bom_cost_change(doc, method=None):
+	"""
+	A submitted BOM's cost feeds every BOM using it as a sub-assembly
+	"""
+	if doc.docstatus == 1:
+		queue_bom_cost_rollup("boms", doc.name)
+
+
+def queue_bom_cost_rollup(kind, name):
+	"""
+	Collect the changed items and BOMs of the transaction; they are handed to
+	the rollup just before it commits, so a price list import queues one job
+	instead of one per Item Price
+	"""
+	pending = frappe.flags.pending_bom_rollup
+	if pending is None:
+		pending = frappe.flags.pending_bom_rollup = {"items": set(), "boms": set()}
+		frappe.db.before_commit.add(flush_bom_cost_rollup)
+		frappe.db.after_rollback.add(discard_bom_cost_rollup)
+
+	pending[kind].add(name)
+
+
+def flush_bom_cost_rollup():
+	"""
+	Add the transaction's items and BOMs to the pending sets and queue the job
+	draining them, unless one is already queued or running: transactions
+	committing meanwhile, like the rows of a Data Import, share one rollup.
+	"""
+	pending = frappe.flags.pop("pending_bom_rollup", None)
+	if not pending or not (pending["items"] or pending["boms"]):
+		return
+
+	cache = frappe.cache()
+	if pending["items"]:
+		cache.sadd(PENDING_ITEMS_KEY, *pending["items"])
+	if pending["boms"]:
+		cache.sadd(PENDING_BOMS_KEY, *pending["boms"])
+
+	# Only the flush that sets the key queues a job, after adding its names, so
+	# a job clearing the key always rechecks the sets before it stops
+	if cache.set(cache.make_key(ROLLUP_SCHEDULED_KEY), 1, nx=True, ex=ROLLUP_SCHEDULED_SECONDS):
+		frappe.enqueue(
+			"dsi_erp.dsi_erp.bom.cost_rollup.rollup_pending_bom_costs",
+			queue="long",
+			enqueue_after_commit=True,
+		)
+
+
+def discard_bom_cost_rollup():
+	frappe.flags.pop("pending_bom_rollup", None)
+
+
+def rollup_pending_bom_costs():
+	"""
+	Background job recosting the BOMs affected by the pending items and BOMs
+	until none are left. Changes made while a rollup runs are picked up by the
+	next pass. Once the sets are empty the scheduled key is cleared and the sets
+	checked once more, so a flush racing the end of the job either sees the
+	key gone and queues a new job, or has its names picked up here.
+	"""
+	updated = 0
+	while True:
+		items, boms = pop_pending(PENDING_ITEMS_KEY), pop_pending(PENDING_BOMS_KEY)
+		if not items and not boms:
+			frappe.cache().delete_value(ROLLUP_SCHEDULED_KEY)
+			items, boms = pop_pending(PENDING_ITEMS_KEY), pop_pending(PENDING_BOMS_KEY)
+			if not items and not boms:
+				return updated
+
+		updated += rollup_bom_costs(items=items, boms=boms)
+
+
+def pop_pending(key):
+	cache = frappe.cache()
+	names = [frappe.safe_decode(name) for name in cache.smembers(key)]
+	if names:
+		cache.srem(key, *names)
+	return names
+
+
+@frappe.whitelist()
+def update_all_bom_costs():
+	"""
+	Queue a rollup of every active BOM, bottom-up through the whole tree
+	"""
+	frappe.only_for("System Manager")
+	return enqueue_bom_cost_rollup()
+
+
+def enqueue_bom_cost_rollup(items=None, boms=None):
+	full_rollup = items is None and boms is None
+	job = frappe.enqueue(
+		"dsi_erp.dsi_erp.bom.cost_rollup.rollup_bom_costs",
+		queue="long",
+		enqueue_after_commit=True,
+		job_id="rollup_bom_costs" if full_rollup else None,
+		deduplicate=full_rollup,
+		items=items,
+		boms=boms,
+	)
+	return job.id if job else None
+
+
+def rollup_bom_costs(items=None, boms=None):
+	"""
+	Background job recosting the BOMs that use items, or use boms as sub-assemblies,
+	and all their ancestors. With neither given every active BOM is recosted.
+	Returns the number of BOMs updated.
+	"""
+	if items is None and boms is None:
+		affected = set(frappe.get_all("BOM", filters={"is_active": 1, "docstatus": ["<", 2]}, pluck="name"))
+	else:
+		affected = get_affected_boms(items or [], boms or [])
+
+	if not affected:
+		return 0
+
+	rollup = BOMCostRollup(affected)
+	rollup.compute()
+	rollup.save()
+	frappe.db.commit()
+
+	clear_bom_rate_cache(list({header.item for header in rollup.headers.values() if header.name in affected}))
+	return len(affected)
+
+
+def get_affected_boms(items, boms):
+	"""
+	BOMs with a row for one of items or using one of boms, and every BOM above
+	them, one query per level of the tree
+	"""
+	affected = set()
+	conditions, values = [], {}
+	if items:
+		conditions.append("item_code in %(items)s")
+		values["items"] = tuple(items)
+	if boms:
+		conditions.append("bom_no in %(boms)s")
+		values["boms"] = tuple(boms)
+
+	level = get_parent_boms(" or ".join(conditions), values)
+	while level - affected:
+		level -= affected
+		affected |= level
+		level = get_parent_boms("bom_no in %(boms)s", {"boms": tuple(level)})
+
+	return affected
+
+
+def get_parent_boms(condition, values):
+	return set(
+		frappe.db.sql_list(
+			f"""
+        select distinct bi.parent
+        from `tabBOM Item` bi
+        join `tabBOM` bom on bom.name = bi.parent
+        where bi.parenttype = 'BOM' and ({condition})
+            and bom.is_active = 1 and bom.docstatus < 2
+        """,
+			values,
+		)
+	)
+
+
+class BOMCostRollup:
+	"""
+	Costs of the affected BOMs, treating the BOM tree as a DAG: every BOM is
+	costed once, after its sub-assemblies, and memoised. Sub-assemblies outside
+	the affected set keep their stored cost.
+	"""
+
+	def __init__(self, affected):
+		self.affected = affected
+		self.rows = {}
+		self.costs = {}
+		self.row_updates = {}
+		self.load()
+
+	def load(self):
+		affected = tuple(self.affected)
+		self.rows = {}
+		for row in frappe.db.sql(
+			"""
+            select name, parent, item_code, qty, rate, conversion_factor, bom_no
+            from `tabBOM Item`
+            where parenttype = 'BOM' and parent in %(boms)s
+            order by parent, idx
+            """,
+			{"boms": affected},
+			as_dict=True,
+		):
+			self.rows.setdefault(row.parent, []).append(row)
+
+		sub_assemblies = {row.bom_no for rows in self.rows.values() for row in rows if row.bom_no}
+		self.headers = {
+			header.name: header
+			for header in frappe.get_all(
+				"BOM",
+				filters={"name": ["in", list(self.affected | sub_assemblies)]},
+				fields=[
+					"name",
+					"item",
+					"quantity",
+					"conversion_rate",
+					"plc_conversion_rate",
+					"rm_cost_as_per",
+					"buying_price_list",
+					"operating_cost",
+					"base_operating_cost",
+					"scrap_material_cost",
+					"base_scrap_material_cost",
+					"total_cost",
+					"base_total_cost",
+					"custom_profit_percentage",
+				],
+			)
+		}
+		self.load_leaf_rates()
+
+	def load_leaf_rates(self):
+		"""
+		Current buying rate of every raw material, per costing basis, in one query per basis
+		"""
+		leaf_items = tuple({row.item_code for rows in self.rows.values() for row in rows if not row.bom_no})
+		self.price_list_rates, self.valuation_rates, self.last_purchase_rates = {}, {}, {}
+		if not leaf_items:
+			return
+
+		price_lists = tuple(
+			{header.buying_price_list for header in self.headers.values() if header.buying_price_list}
+		)
+		if price_lists:
+			# Later valid_from wins, like erpnext's own price lookup
+			for row in frappe.db.sql(
+				"""
+                select price_list, item_code, price_list_rate
+                from `tabItem Price`
+                where buying = 1 and price_list in %(price_lists)s and item_code in %(items)s
+                    and ifnull(valid_from, '2000-01-01') <= curdate()
+                    and ifnull(valid_upto, '2500-12-31') >= curdate()
+                order by valid_from
+                """,
+				{"price_lists": price_lists, "items": leaf_items},
+				as_dict=True,
+			):
+				self.price_list_rates[(row.price_list, row.item_code)] = flt(row.price_list_rate)
+
+		self.valuation_rates = dict(
+			frappe.db.sql(
+				"""
+            select item_code, sum(stock_value) / sum(actual_qty)
+            from `tabBin`
+            where item_code in %(items)s and actual_qty > 0
+            group by item_code
+            """,
+				{"items": leaf_items},
+			)
+		)
+
+		self.last_purchase_rates = dict(
+			frappe.db.sql(
+				"select name, last_purchase_rate from `tabItem` where name in %(items)s",
+				{"items": leaf_items},
+			)
+		)
+
+	def compute(self):
+		for bom in self.affected:
+			self.get_total_cost(bom)
+
+	def get_base_unit_cost(self, bom, path):
+		"""
+		Cost of one unit of bom in company currency, like erpnext's get_bom_unitcost
+		"""
+		header = self.headers.get(bom)
+		if not header:
+			return 0
+
+		if bom not in self.affected:
+			return flt(header.base_total_cost) / (flt(header.quantity) or 1)
+
+		self.get_total_cost(bom, path)
+		return self.get_base_total_cost(header) / (flt(header.quantity) or 1)
+
+	def get_base_total_cost(self, header):
+		return (
+			flt(header.base_operating_cost)
+			+ header.raw_material_cost * (flt(header.conversion_rate) or 1)
+			- flt(header.base_scrap_material_cost)
+		)
+
+	def get_total_cost(self, bom, path=()):
+		if bom in self.costs:
+			return self.costs[bom]
+
+		header = self.headers.get(bom)
+		if bom not in self.affected:
+			return flt(header.total_cost) if header else 0
+
+		if bom in path:
+			frappe.throw(_("BOM {0} contains itself through {1}").format(bom, " → ".join(path)))
+
+		conversion_rate = flt(header.conversion_rate) or 1
+		raw_material_cost = 0
+		for row in self.rows.get(bom, []):
+			if row.bom_no:
+				# Sub-assemblies may be costed in another currency, go through the company's
+				rate = (
+					self.get_base_unit_cost(row.bom_no, (*path, bom))
+					* (flt(row.conversion_factor) or 1)
+					/ conversion_rate
+				)
+			else:
+				rate = self.get_leaf_rate(header, row)
+
+			amount = flt(rate) * flt(row.qty)
+			raw_material_cost += amount
+			self.row_updates[row.name] = {
+				"rate": rate,
+				"base_rate": rate * conversion_rate,
+				"amount": amount,
+				"base_amount": amount * conversion_rate,
+			}
+
+		header.raw_material_cost = raw_material_cost
+		self.costs[bom] = raw_material_cost + flt(header.operating_cost) - flt(header.scrap_material_cost)
+		return self.costs[bom]
+
+	def get_leaf_rate(self, header, row):
+		if header.rm_cost_as_per == "Price List":
+			rate = self.price_list_rates.get((header.buying_price_list, row.item_code))
+			if rate is not None:
+				rate *= flt(header.plc_conversion_rate) or 1
+		elif header.rm_cost_as_per == "Valuation Rate":
+			rate = self.valuation_rates.get(row.item_code)
+		elif header.rm_cost_as_per == "Last Purchase Rate":
+			rate = self.last_purchase_rates.get(row.item_code)
+		else:
+			rate = None
+
+		if not rate:
+			# Manual rates, or no price found: keep what the row has
+			return flt(row.rate)
+
+		return flt(rate) * (flt(row.conversion_factor) or 1) / (flt(header.conversion_rate) or 1)
+
+	def save(self):
+		if self.row_updates:
+			frappe.db.bulk_update("BOM Item", self.row_updates, update_modified=False)
+
+		bom_updates = {}
+		for bom, total_cost in self.costs.items():
+			header = self.headers[bom]
+			conversion_rate = flt(header.conversion_rate) or 1
+			bom_updates[bom] = {
+				"raw_material_cost": header.raw_material_cost,
+				"base_raw_material_cost": header.raw_material_cost * conversion_rate,
+				"total_cost": total_cost,
+				"base_total_cost": self.get_base_total_cost(header),
+				"custom_net_cost": get_net_cost(total_cost, header.custom_profit_percentage),
+			}
+
+		if bom_updates:
+			frappe.db.bulk_update("BOM", bom_updates, update_modified=False)
@@ -0,0 +1,118 @@
+import frappe
+from frappe import _
+from frappe.utils import flt
+
+
+def set_dependent_quantities(doc, method=None):
+	"""
+	before_validate: set the qty of BOM rows whose item depends on other items
+	of the BOM, so quantities are right however the BOM is saved
+	"""
+	quantities = get_dependent_quantities_for_rows(doc.get("items") or [])
+
+	updated = set()
+	for row in doc.get("items") or []:
+		# Like the form, only the first row of a dependent item is updated
+		if row.item_code in quantities and row.item_code not in updated:
+			row.qty = quantities[row.item_code]
+			updated.add(row.item_code)
+
+
+@frappe.whitelist()
+def get_dependent_quantities(items):
+	"""
+	Dependent item -> total qty for BOM rows given as [{"item_code", "qty"}]
+	"""
+	if isinstance(items, str):
+		items = frappe.parse_json(items)
+
+	return get_dependent_quantities_for_rows([frappe._dict(row) for row in items or []])
+
+
+def get_dependent_quantities_for_rows(rows, graph=None, expansions=None):
+	"""
+	graph and expansions can be shared across BOMs, see load_dependency_graph and expand_item
+	"""
+	rows = [row for row in rows if row.item_code]
+	if not rows:
+		return {}
+
+	if graph is None:
+		graph = load_dependency_graph({row.item_code for row in rows})
+	if expansions is None:
+		expansions = {}
+
+	item_codes = {row.item_code for row in rows}
+	dependents = {
+		dependent for item_code in item_codes for dependent in expand_item(item_code, graph, expansions)
+	}
+
+	# Rows of dependent items take their qty from the rows they depend on,
+	# only the other rows feed quantities into the graph
+	quantities = {}
+	for row in rows:
+		if row.item_code in dependents or not flt(row.qty):
+			continue
+
+		for dependent, qty_per_unit in expand_item(row.item_code, graph, expansions).items():
+			quantities[dependent] = quantities.get(dependent, 0) + flt(row.qty) * qty_per_unit
+
+	return quantities
+
+
+def load_dependency_graph(item_codes):
+	"""
+	item -> {dependent item: qty per unit} for item_codes and everything they
+	depend on, one query per level of the dependency tree
+	"""
+	graph = {}
+	pending = set(item_codes)
+
+	while pending:
+		for item_code in pending:
+			graph[item_code] = {}
+
+		rows = frappe.db.sql(
+			"""
+            select parent, item, quantity
+            from `tabDepend Item`
+            where parenttype = 'Item' and parentfield = 'custom_depending_items'
+                and parent in %(items)s and ifnull(item, '') != '' and ifnull(quantity, 0) != 0
+            """,
+			{"items": tuple(pending)},
+			as_dict=True,
+		)
+		for row in rows:
+			edges = graph[row.parent]
+			edges[row.item] = edges.get(row.item, 0) + flt(row.quantity)
+
+		pending = {row.item for row in rows if row.item not in graph}
+
+	return graph
+
+
+def expand_item(item_code, graph, expansions, path=None):
+	"""
+	Every item item_code depends on, directly or through other items, with the
+	qty needed per unit of item_code. Each item is expanded once and memoised in
+	expansions; an item met again on its own path is a cycle.
+	"""
+	if item_code in expansions:
+		return expansions[item_code]
+
+	path = path or []
+	if item_code in path:
+		cycle = path[path.index(item_code) :] + [item_code]
+		frappe.throw(
+			_("Depending items form a cycle: {0}").format(" → ".join(cycle)),
+			title=_("Circular Item Dependency"),
+		)
+
+	expansion = {}
+	for dependent, qty in graph.get(item_code, {}).items():
+		expansion[dependent] = expansion.get(dependent, 0) + qty
+		for nested, nested_qty in expand_item(dependent, graph, expansions, [*path, item_code]).items():
+			expansion[nested] = expansion.get(nested, 0) + qty * nested_qty
+
+	expansions[item_code] = expansion
+	return expansion
@@ -0,0 +1,289 @@
+import ast
+import math
+import operator
+from functools import lru_cache
+
+import frappe
+from frappe import _
+from frappe.utils import flt
+
+from dsi_erp.dsi_erp.bom.dependent_items import get_dependent_quantities_for_rows, load_dependency_graph
+
+# Formula variable -> BOM field it reads
+FORMULA_VARIABLES = {
+	"L": "custom_total_length",
+	"W": "custom_total_width",
+	"A": "custom_total_area",
+	"ML": "custom_module_length",
+	"MW": "custom_module_width",
+	"NOM": "custom_noof_modules",
+	"WL": "custom_wall_length",
+	"WWL": "custom_wet_wall_length",
+}
+
+BINARY_OPERATORS = {
+	ast.Add: operator.add,
+	ast.Sub: operator.sub,
+	ast.Mult: operator.mul,
+	ast.Div: operator.truediv,
+	ast.Pow: operator.pow,
+}
+
+UNARY_OPERATORS = {
+	ast.UAdd: operator.pos,
+	ast.USub: operator.neg,
+}
+
+
+class FormulaError(frappe.ValidationError):
+	pass
+
+
+def set_formula_quantities(doc, method=None):
+	"""
+	before_validate: qty of every BOM row with a formula, from the BOM's dimensions.
+	A draft keeps the qty of rows whose formula fails, with a warning, so it can
+	be saved while the dimensions are still being filled in; submitting fails.
+	"""
+	variables = get_formula_variables(doc)
+	errors = []
+	for row in doc.get("items") or []:
+		if not (row.custom_formula or "").strip():
+			continue
+
+		if doc.docstatus == 1:
+			row.qty = evaluate_row_formula(row, variables)
+			continue
+
+		try:
+			row.qty = evaluate_formula(row.custom_formula, variables)
+		except FormulaError as e:
+			errors.append(get_formula_error_message(row, e))
+
+	if errors:
+		frappe.msgprint(
+			"<br>".join(errors) + "<br>" + _("The quantity of these rows was left unchanged."),
+			title=_("Invalid Quantity Formula"),
+			indicator="orange",
+		)
+
+
+@frappe.whitelist()
+def get_formula_quantities(dimensions, rows):
+	"""
+	Row name -> qty for rows given as [{"name", "formula"}], dimensions holding
+	the BOM's dimension fields. Lets the form recalculate all rows in one call.
+	Rows whose formula fails are left out and reported in a warning.
+	"""
+	frappe.has_permission("BOM", "write", throw=True)
+
+	dimensions = frappe._dict(frappe.parse_json(dimensions) if isinstance(dimensions, str) else dimensions)
+	rows = frappe.parse_json(rows) if isinstance(rows, str) else rows
+
+	variables = get_formula_variables(dimensions)
+	quantities, errors = {}, []
+	for row in rows or []:
+		if not (row.get("formula") or "").strip():
+			continue
+
+		try:
+			quantities[row["name"]] = evaluate_formula(row["formula"], variables)
+		except FormulaError as e:
+			errors.append(get_formula_error_message(frappe._dict(idx=row.get("idx")), e))
+
+	if errors:
+		frappe.msgprint("<br>".join(errors), title=_("Invalid Quantity Formula"), indicator="orange")
+
+	return quantities
+
+
+@frappe.whitelist()
+def recalculate_bom_quantities(bom=None, project=None):
+	"""
+	Re-evaluate the formulas of a draft BOM, or of every draft BOM of a project,
+	in one pass: two reads, one bulk update of the rows, one update of the totals.
+	Rows whose formula fails keep their qty and are reported in a warning.
+	"""
+	if not bom and not project:
+		frappe.throw(_("Select a BOM or a Project."))
+
+	frappe.has_permission("BOM", "write", throw=True)
+
+	filters = {"docstatus": 0}
+	if bom:
+		filters["name"] = bom
+	if project:
+		filters["project"] = project
+
+	boms = frappe.get_all(
+		"BOM", filters=filters, fields=["name", "conversion_rate", *FORMULA_VARIABLES.values()]
+	)
+	if not boms:
+		return {"boms": 0, "rows": 0}
+
+	rows_by_bom = {}
+	for row in frappe.get_all(
+		"BOM Item",
+		filters={"parenttype": "BOM", "parent": ["in", [bom.name for bom in boms]]},
+		fields=["name", "parent", "idx", "item_code", "qty", "rate", "conversion_factor", "custom_formula"],
+		order_by="parent, idx",
+	):
+		rows_by_bom.setdefault(row.parent, []).append(row)
+
+	graph = load_dependency_graph(
+		{row.item_code for rows in rows_by_bom.values() for row in rows if row.item_code}
+	)
+	expansions = {}
+
+	updates, errors = {}, []
+	for bom in boms:
+		rows = rows_by_bom.get(bom.name, [])
+		variables = get_formula_variables(bom)
+		for row in rows:
+			if not (row.custom_formula or "").strip():
+				continue
+
+			try:
+				row.qty = evaluate_formula(row.custom_formula, variables)
+			except FormulaError as e:
+				errors.append(get_formula_error_message(row, e, bom.name))
+
+		dependent_quantities = get_dependent_quantities_for_rows(rows, graph, expansions)
+		for row in rows:
+			if row.item_code in dependent_quantities:
+				row.qty = dependent_quantities.pop(row.item_code)
+
+			amount = flt(row.rate) * flt(row.qty)
+			updates[row.name] = {
+				"qty": row.qty,
+				"stock_qty": flt(row.qty) * (flt(row.conversion_factor) or 1),
+				"amount": amount,
+				"base_amount": amount * (flt(bom.conversion_rate) or 1),
+			}
+
+	if updates:
+		frappe.db.bulk_update("BOM Item", updates, update_modified=False)
+		update_raw_material_totals(tuple(bom.name for bom in boms))
+
+	if errors:
+		frappe.msgprint(
+			"<br>".join(errors) + "<br>" + _("The quantity of these rows was left unchanged."),
+			title=_("Invalid Quantity Formula"),
+			indicator="orange",
+		)
+
+	return {"boms": len(boms), "rows": len(updates), "errors": len(errors)}
+
+
+def update_raw_material_totals(boms):
+	frappe.db.sql(
+		"""
+        update `tabBOM` bom
+        join (
+            select parent, sum(amount) as amount, sum(base_amount) as base_amount
+            from `tabBOM Item`
+            where parenttype = 'BOM' and parent in %(boms)s
+            group by parent
+        ) items on items.parent = bom.name
+        set
+            bom.raw_material_cost = items.amount,
+            bom.base_raw_material_cost = items.base_amount,
+            bom.total_cost = ifnull(bom.operating_cost, 0) + items.amount - ifnull(bom.scrap_material_cost, 0),
+            bom.base_total_cost = ifnull(bom.base_operating_cost, 0) + items.base_amount - ifnull(bom.base_scrap_material_cost, 0),
+            bom.custom_net_cost = (ifnull(bom.operating_cost, 0) + items.amount - ifnull(bom.scrap_material_cost, 0))
+                * (1 + ifnull(bom.custom_profit_percentage, 0) / 100)
+        """,
+		{"boms": boms},
+	)
+
+
+def get_formula_variables(doc):
+	variables = {variable: flt(doc.get(fieldname)) for variable, fieldname in FORMULA_VARIABLES.items()}
+	# Area follows length x width unless it was entered
+	if not variables["A"]:
+		variables["A"] = variables["L"] * variables["W"]
+	return variables
+
+
+def evaluate_row_formula(row, variables, bom=None):
+	try:
+		return evaluate_formula(row.custom_formula, variables)
+	except FormulaError as e:
+		frappe.throw(
+			get_formula_error_message(row, e, bom), FormulaError, title=_("Invalid Quantity Formula")
+		)
+
+
+def get_formula_error_message(row, error, bom=None):
+	location = _("Row {0}").format(row.idx) if not bom else _("BOM {0}, row {1}").format(bom, row.idx)
+	return f"{location}: {error}"
+
+
+def evaluate_formula(formula, variables):
+	"""
+	Value of formula, evaluated in floats so no formula can build huge integers
+	"""
+	try:
+		value = compile_formula(formula.strip().upper())(variables)
+		# A fractional power of a negative number has no real value
+		if isinstance(value, complex):
+			raise FormulaError(_("Formula {0} takes a fractional power of a negative number").format(formula))
+
+		value = float(value)
+	except ZeroDivisionError:
+		raise FormulaError(_("Formula {0} divides by zero").format(formula))
+	except (OverflowError, ValueError):
+		raise FormulaError(_("Formula {0} gives a number too large").format(formula))
+
+	if not math.isfinite(value):
+		raise FormulaError(_("Formula {0} gives a number too large").format(formula))
+
+	return flt(value)
+
+
+@lru_cache(maxsize=1024)
+def compile_formula(formula):
+	"""
+	Parse formula once into a function of the variables. Only numbers, the
+	FORMULA_VARIABLES, + - * / ** and brackets are accepted; anything else is
+	rejected while compiling, nothing is ever passed to eval.
+	"""
+	try:
+		tree = ast.parse(formula, mode="eval")
+	except SyntaxError:
+		raise FormulaError(_("Formula {0} is not valid").format(formula))
+
+	return compile_node(tree.body, formula)
+
+
+def compile_node(node, formula):
+	if (
+		isinstance(node, ast.Constant)
+		and isinstance(node.value, int | float)
+		and not isinstance(node.value, bool)
+	):
+		try:
+			value = float(node.value)
+		except OverflowError:
+			raise FormulaError(_("Formula {0} gives a number too large").format(formula))
+		return lambda variables: value
+
+	if isinstance(node, ast.Name) and node.id in FORMULA_VARIABLES:
+		name = node.id
+		return lambda variables: variables[name]
+
+	if isinstance(node, ast.BinOp) and type(node.op) in BINARY_OPERATORS:
+		function = BINARY_OPERATORS[type(node.op)]
+		left, right = compile_node(node.left, formula), compile_node(node.right, formula)
+		return lambda variables: function(left(variables), right(variables))
+
+	if isinstance(node, ast.UnaryOp) and type(node.op) in UNARY_OPERATORS:
+		function = UNARY_OPERATORS[type(node.op)]
+		operand = compile_node(node.operand, formula)
+		return lambda variables: function(operand(variables))
+
+	raise FormulaError(
+		_("Formula {0} may only use numbers, {1} and + - * / ** ( )").format(
+			formula, ", ".join(FORMULA_VARIABLES)
+		)
+	)
@@ -0,0 +1,8 @@
+// Copyright (c) 2026, Siva and contributors
+// For license information, please see license.txt
+
+// frappe.ui.form.on("Interview Reminder Log", {
+// 	refresh(frm) {
+
+// 	},
+// });
@@ -0,0 +1,203 @@
+# Copyright (c) 2026, Siva and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import cint
+
+# Only the lowest gaps are remembered, anything above is never reused
+FREE_LIST_LIMIT = 100
+
+
+class ItemCodeSequence(Document):
+	pass
+
+
+def format_item_code(prefix, number):
+	return f"{prefix}-{str(number).zfill(4)}"
+
+
+def parse_item_code(item_code):
+	"""
+	Split an item code into (prefix, number), or (None, None) if it is not sequence generated
+	"""
+	prefix, _, number = (item_code or "").rpartition("-")
+	if not prefix or not number.isdigit():
+		return None, None
+	return prefix, int(number)
+
+
+def allocate_item_code(prefix):
+	"""
+	Hand out the next free item code for prefix. The sequence row stays locked until
+	the caller's transaction ends, so concurrent saves never get the same code.
+	"""
+	current, free_numbers = lock_sequence(prefix)
+
+	while True:
+		if free_numbers:
+			number = free_numbers.pop(0)
+		else:
+			current += 1
+			number = current
+
+		item_code = format_item_code(prefix, number)
+		# codes typed in by hand are skipped, not handed out twice
+		if not frappe.db.exists("Item", item_code):
+			break
+
+	update_sequence(prefix, current, free_numbers)
+	return item_code
+
+
+def reserve_item_codes(prefix, count):
+	"""
+	Reserve a contiguous block of count codes after the current counter in one step
+	"""
+	current, free_numbers = lock_sequence(prefix)
+	item_codes = []
+
+	while len(item_codes) < count:
+		block = [
+			format_item_code(prefix, number)
+			for number in range(current + 1, current + 1 + count - len(item_codes))
+		]
+		current += len(block)
+		taken = set(frappe.get_all("Item", filters={"name": ["in", block]}, pluck="name"))
+		item_codes.extend(code for code in block if code not in taken)
+
+	update_sequence(prefix, current, free_numbers)
+	return item_codes
+
+
+def peek_item_code(prefix):
+	"""
+	The code allocate_item_code would hand out next, without locking or consuming it
+	"""
+	sequence = frappe.db.get_value("Item Code Sequence", prefix, ["current", "free_numbers"], as_dict=1)
+	if sequence:
+		current, free_numbers = cint(sequence.current), parse_free_numbers(sequence.free_numbers)
+	else:
+		current, free_numbers = scan_existing_numbers(prefix)
+
+	return format_item_code(prefix, free_numbers[0] if free_numbers else current + 1)
+
+
+def release_item_code(item_code):
+	"""
+	Put the number of a deleted or renamed item back on its prefix's free list
+	"""
+	prefix, number = parse_item_code(item_code)
+	if not prefix or not frappe.db.exists("Item Code Sequence", prefix):
+		return
+
+	current, free_numbers = lock_sequence(prefix)
+	if number > current or number in free_numbers or len(free_numbers) >= FREE_LIST_LIMIT:
+		return
+
+	free_numbers.append(number)
+	update_sequence(prefix, current, sorted(free_numbers))
+
+
+def lock_sequence(prefix):
+	"""
+	Return (current, free_numbers) for prefix with the row locked FOR UPDATE.
+	A prefix seen for the first time is seeded from the existing items.
+	"""
+	row = _select_for_update(prefix)
+	if not row:
+		current, free_numbers = scan_existing_numbers(prefix)
+		try:
+			frappe.get_doc(
+				{
+					"doctype": "Item Code Sequence",
+					"prefix": prefix,
+					"current": current,
+					"free_numbers": format_free_numbers(free_numbers),
+				}
+			).insert(ignore_permissions=True)
+		except frappe.DuplicateEntryError:
+			# another worker seeded the same prefix first
+			pass
+		row = _select_for_update(prefix)
+
+	return cint(row[0][0]), parse_free_numbers(row[0][1])
+
+
+def _select_for_update(prefix):
+	return frappe.db.sql(
+		"""select current, free_numbers from `tabItem Code Sequence`
+		where name = %s for update""",
+		prefix,
+	)
+
+
+def update_sequence(prefix, current, free_numbers):
+	frappe.db.set_value(
+		"Item Code Sequence",
+		prefix,
+		{"current": current, "free_numbers": format_free_numbers(free_numbers)},
+		update_modified=False,
+	)
+
+
+def scan_existing_numbers(prefix):
+	"""
+	Highest number and lowest gaps for prefix, read from the Item table
+	"""
+	item_codes = frappe.get_all("Item", filters={"item_code": ["like", f"{prefix}-%"]}, pluck="item_code")
+	numbers = []
+	for item_code in item_codes:
+		code_prefix, number = parse_item_code(item_code)
+		if code_prefix == prefix:
+			numbers.append(number)
+
+	return get_current_and_gaps(numbers)
+
+
+def get_current_and_gaps(numbers):
+	used = set(numbers)
+	current = max(used, default=0)
+	gaps = []
+	for number in range(1, current):
+		if number not in used:
+			gaps.append(number)
+			if len(gaps) >= FREE_LIST_LIMIT:
+				break
+	return current, gaps
+
+
+def parse_free_numbers(value):
+	return sorted(cint(number) for number in (value or "").split(",") if number.strip())
+
+
+def format_free_numbers(numbers):
+	return ",".join(str(number) for number in numbers)
+
+
+def seed_item_code_sequences():
+	"""
+	Rebuild every sequence from the item catalog in one pass over the Item table.
+	Run once after install, or again to repair counters after a manual import.
+	"""
+	numbers_by_prefix = {}
+	for item_code in frappe.get_all("Item", filters={"item_code": ["like", "%-%"]}, pluck="item_code"):
+		prefix, number = parse_item_code(item_code)
+		if prefix:
+			numbers_by_prefix.setdefault(prefix, []).append(number)
+
+	for prefix, numbers in numbers_by_prefix.items():
+		current, free_numbers = get_current_and_gaps(numbers)
+		if frappe.db.exists("Item Code Sequence", prefix):
+			update_sequence(prefix, current, free_numbers)
+		else:
+			frappe.get_doc(
+				{
+					"doctype": "Item Code Sequence",
+					"prefix": prefix,
+					"current": current,
+					"free_numbers": format_free_numbers(free_numbers),
+				}
+			).insert(ignore_permissions=True)
+
+	return len(numbers_by_prefix)
@@ -0,0 +1,107 @@
+# Copyright (c) 2026, Siva and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import flt, now_datetime
+
+from dsi_erp.dsi_erp.quotation.quotation import get_quotation_boms
+
+SNAPSHOT_FIELDS = [
+	"quotation",
+	"transaction_date",
+	"company",
+	"customer",
+	"item_code",
+	"item_group",
+	"bom",
+	"qty",
+	"unit_cost",
+	"currency",
+	"rate",
+	"base_rate",
+]
+
+
+class QuotationCostSnapshot(Document):
+	pass
+
+
+def create_cost_snapshot(doc, method=None):
+	"""
+	Quotation on_submit: keep the estimated BOM cost next to the quoted rate of
+	every row, so margins can be analysed after the BOMs have changed
+	"""
+	boms = get_snapshot_boms(doc.items)
+	customer = doc.party_name if doc.quotation_to == "Customer" else None
+	now = now_datetime()
+	user = frappe.session.user
+
+	values = []
+	for row in doc.items:
+		if not row.item_code:
+			continue
+
+		bom = boms.get(row.custom_bom) or boms.get(row.item_code)
+		values.append(
+			[
+				frappe.generate_hash(length=10),
+				user,
+				user,
+				now,
+				now,
+				doc.name,
+				doc.transaction_date,
+				doc.company,
+				customer,
+				row.item_code,
+				row.item_group,
+				bom.name if bom else None,
+				row.qty,
+				get_base_unit_cost(bom) * flt(row.conversion_factor or 1) if bom else 0,
+				doc.currency,
+				row.net_rate,
+				row.base_net_rate,
+			]
+		)
+
+	if values:
+		frappe.db.bulk_insert(
+			"Quotation Cost Snapshot",
+			fields=["name", "owner", "modified_by", "creation", "modified", *SNAPSHOT_FIELDS],
+			values=values,
+		)
+
+
+def delete_cost_snapshot(doc, method=None):
+	frappe.db.delete("Quotation Cost Snapshot", {"quotation": doc.name})
+
+
+def get_snapshot_boms(rows):
+	"""
+	BOMs of the rows in two queries: rows naming a BOM are keyed by that BOM,
+	the rest by item and fall back to the item's quotation BOM
+	"""
+	named = list({row.custom_bom for row in rows if row.get("custom_bom")})
+	boms = (
+		{
+			bom.name: bom
+			for bom in frappe.get_all(
+				"BOM", filters={"name": ["in", named]}, fields=["name", "item", "quantity", "base_total_cost"]
+			)
+		}
+		if named
+		else {}
+	)
+
+	boms.update(
+		get_quotation_boms(
+			list({row.item_code for row in rows if row.item_code and not row.get("custom_bom")})
+		)
+	)
+	return boms
+
+
+def get_base_unit_cost(bom):
+	# Cost before profit per stock unit in company currency, the rows convert it to their UOM
+	return flt(bom.base_total_cost) / (flt(bom.quantity) or 1)
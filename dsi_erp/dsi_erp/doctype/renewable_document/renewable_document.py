@@ -1,72 +1,227 @@
 # Copyright (c) 2025, Siva and contributors
 # For license information, please see license.txt
 
+import hashlib
+
 import frappe
+from frappe import _
 from frappe.model.document import Document
+from frappe.model.naming import make_autoname
+from frappe.utils import add_days, cint, cstr, formatdate, getdate, now_datetime, nowdate
+
+# Fields copied from the Employee child table to each Renewable Document
+SYNCED_FIELDS = ["document_name", "document_number", "date_of_issue", "valid_upto", "place_of_issue"]
+
+# Used while Dsi Erp Settings has no reminder days configured
+DEFAULT_REMINDER_DAYS = [90, 60, 30, 7]
 
 
 class RenewableDocument(Document):
 	pass
 
 
-def sync_renewable_documents_from_employee(employee_name):
+def sync_renewable_documents_from_employee(employee_name, employee=None):
 	"""
-	Sync renewable documents from employee child table to main Renewable Document doctype
+	Sync renewable documents from employee child table to main Renewable Document doctype.
+	Only the differences are written, with bulk statements inside the caller's transaction.
 	"""
-	employee = frappe.get_doc("Employee", employee_name)
-	
+	employee = employee or frappe.get_doc("Employee", employee_name)
+
 	# Get all existing renewable documents for this employee
-	existing_docs = frappe.get_all("Renewable Document", 
-		filters={"employee": employee_name}, 
-		fields=["name", "document_name", "document_number"]
+	existing_docs = frappe.get_all(
+		"Renewable Document",
+		filters={"employee": employee_name},
+		fields=["name", "email", *SYNCED_FIELDS],
 	)
-	
-	# Create a dictionary for quick lookup
+
+	# Create a dictionary for quick lookup, extra documents with the same key are stale
 	existing_docs_dict = {}
+	to_delete = []
 	for doc in existing_docs:
-		key = f"{doc.document_name}_{doc.document_number}"
-		existing_docs_dict[key] = doc.name
-	
-	# Track which documents are still in the child table
-	active_doc_keys = set()
-	
-	# Process each child document
-	if employee.custom_renewable_documents:
-		for child_doc in employee.custom_renewable_documents:
-			# Create a unique key based on document name and number
-			doc_key = f"{child_doc.document_name}_{child_doc.document_number}"
-			active_doc_keys.add(doc_key)
-			
-			if doc_key in existing_docs_dict:
-				# Update existing document
-				doc = frappe.get_doc("Renewable Document", existing_docs_dict[doc_key])
-			else:
-				# Create new document
-				doc = frappe.get_doc({
-					"doctype": "Renewable Document",
-					"employee": employee_name
-				})
-			
-			# Update fields from child table (excluding document field)
-			doc.document_name = child_doc.document_name
-			doc.document_number = child_doc.document_number
-			doc.date_of_issue = child_doc.date_of_issue
-			doc.valid_upto = child_doc.valid_upto
-			doc.place_of_issue = child_doc.place_of_issue
-			
-			doc.save(ignore_permissions=True)
-	
+		key = get_document_key(doc)
+		if key in existing_docs_dict:
+			to_delete.append(doc.name)
+		else:
+			existing_docs_dict[key] = doc
+
+	# Later rows win when the child table lists the same document twice
+	child_docs = {get_document_key(row): row for row in employee.custom_renewable_documents or []}
+
+	email = employee.company_email
+	to_insert = []
+	for doc_key, child_doc in child_docs.items():
+		existing = existing_docs_dict.get(doc_key)
+		if not existing:
+			to_insert.append(child_doc)
+			continue
+
+		values = get_synced_values(child_doc)
+		changed = {
+			field: value
+			for field, value in values.items()
+			if normalise(existing.get(field)) != normalise(value)
+		}
+		if cstr(existing.email) != cstr(email):
+			changed["email"] = email
+		if "valid_upto" in changed:
+			# A renewed document starts its reminders over
+			changed["last_notified_threshold"] = 0
+		if changed:
+			frappe.db.set_value("Renewable Document", existing.name, changed)
+
 	# Delete documents that are no longer in the child table
-	for doc_key, doc_name in existing_docs_dict.items():
-		if doc_key not in active_doc_keys:
-			frappe.delete_doc("Renewable Document", doc_name, ignore_permissions=True)
-	
-	frappe.db.commit()
+	to_delete += [doc.name for doc_key, doc in existing_docs_dict.items() if doc_key not in child_docs]
+	if to_delete:
+		frappe.db.delete("Renewable Document", {"name": ["in", to_delete]})
+
+	if to_insert:
+		insert_renewable_documents(employee_name, email, to_insert)
+
+
+def insert_renewable_documents(employee_name, email, child_docs):
+	now = now_datetime()
+	user = frappe.session.user
+	values = []
+	for child_doc in child_docs:
+		synced_values = get_synced_values(child_doc)
+		values.append(
+			[
+				make_autoname("DOC-.#####", "Renewable Document"),
+				user,
+				user,
+				now,
+				now,
+				employee_name,
+				email,
+				*(synced_values[field] for field in SYNCED_FIELDS),
+			]
+		)
+
+	frappe.db.bulk_insert(
+		"Renewable Document",
+		fields=["name", "owner", "modified_by", "creation", "modified", "employee", "email", *SYNCED_FIELDS],
+		values=values,
+	)
+
+
+def get_document_key(doc):
+	# A unique key based on document name and number
+	return f"{doc.document_name}_{doc.document_number}"
+
+
+def get_synced_values(child_doc):
+	# Fields copied from the child table (excluding document field)
+	return {field: child_doc.get(field) for field in SYNCED_FIELDS}
+
+
+def normalise(value):
+	# Dates come back from the database as date objects, but may be strings on the document
+	return cstr(value)
+
+
+def get_renewable_documents_hash(employee):
+	content = [
+		[normalise(row.get(field)) for field in SYNCED_FIELDS]
+		for row in employee.get("custom_renewable_documents") or []
+	]
+	return hashlib.sha1(frappe.as_json([content, cstr(employee.get("company_email"))]).encode()).hexdigest()
+
+
+def renewable_documents_changed(employee):
+	previous = employee.get_doc_before_save()
+	if not previous:
+		return True
+	return get_renewable_documents_hash(employee) != get_renewable_documents_hash(previous)
 
 
 def on_employee_update(doc, method):
 	"""
-	Hook to sync renewable documents when employee is updated
+	Hook to sync renewable documents when employee is updated and its documents changed
+	"""
+	if method == "on_update" and renewable_documents_changed(doc):
+		sync_renewable_documents_from_employee(doc.name, doc)
+
+
+def get_reminder_days():
+	value = frappe.db.get_single_value("Dsi Erp Settings", "renewable_document_reminder_days")
+	days = sorted({cint(day) for day in (value or "").split(",") if cint(day) > 0}, reverse=True)
+	return days or DEFAULT_REMINDER_DAYS
+
+
+def send_expiry_reminders():
+	"""
+	Daily job: every document that crossed a reminder threshold since it was last
+	notified goes into one digest for the employee and one for their manager.
+	The threshold sent is stored on the document, so reruns send nothing twice.
 	"""
-	if method == "on_update":
-		sync_renewable_documents_from_employee(doc.name)
+	reminder_days = get_reminder_days()
+	today = getdate(nowdate())
+
+	# Range scan on the valid_upto index, only documents inside the widest window
+	documents = frappe.db.sql(
+		"""
+		select
+			rd.name, rd.employee, rd.document_name, rd.document_number, rd.valid_upto,
+			datediff(rd.valid_upto, %(today)s) as days_left,
+			ifnull(rd.last_notified_threshold, 0) as last_notified_threshold,
+			emp.employee_name,
+			coalesce(nullif(rd.email, ''), nullif(emp.company_email, ''), emp.user_id) as employee_email,
+			coalesce(nullif(mgr.company_email, ''), mgr.user_id) as manager_email
+		from `tabRenewable Document` rd
+		left join `tabEmployee` emp on emp.name = rd.employee
+		left join `tabEmployee` mgr on mgr.name = emp.reports_to
+		where rd.valid_upto between %(today)s and %(horizon)s
+		""",
+		{"today": today, "horizon": add_days(today, reminder_days[0])},
+		as_dict=True,
+	)
+
+	digests = {}
+	notified = {}
+	for document in documents:
+		threshold = min(day for day in reminder_days if document.days_left <= day)
+		if document.last_notified_threshold and document.last_notified_threshold <= threshold:
+			continue
+
+		notified.setdefault(threshold, []).append(document.name)
+		for recipient in {document.employee_email, document.manager_email}:
+			if recipient:
+				digests.setdefault(recipient, []).append(document)
+
+	for recipient, recipient_documents in digests.items():
+		frappe.sendmail(
+			recipients=[recipient],
+			subject=_("Documents expiring soon ({0})").format(len(recipient_documents)),
+			message=get_expiry_digest_message(recipient_documents),
+		)
+
+	for threshold, names in notified.items():
+		frappe.db.set_value(
+			"Renewable Document",
+			{"name": ["in", names]},
+			"last_notified_threshold",
+			threshold,
+			update_modified=False,
+		)
+
+
+def get_expiry_digest_message(documents):
+	rows = "".join(
+		f"""<tr>
+			<td>{frappe.utils.escape_html(document.employee_name or document.employee or "")}</td>
+			<td>{frappe.utils.escape_html(document.document_name or "")}</td>
+			<td>{frappe.utils.escape_html(document.document_number or "")}</td>
+			<td>{formatdate(document.valid_upto)}</td>
+			<td>{document.days_left}</td>
+		</tr>"""
+		for document in sorted(documents, key=lambda d: (d.valid_upto, d.employee or ""))
+	)
+	return f"""<p>Dear Sir/Madam,</p>
+		<p>The following documents are due for renewal:</p>
+		<table class="table table-bordered">
+			<tr><th>Employee</th><th>Document</th><th>Number</th><th>Valid Upto</th><th>Days Left</th></tr>
+			{rows}
+		</table>
+		<br>
+		<p>Regards,</p>
+		<p>HR Team</p>"""
@@ -0,0 +1,166 @@
+# Copyright (c) 2026, Siva and contributors
+# For license information, please see license.txt
+
+import time
+
+import frappe
+from frappe.model.document import Document
+from frappe.utils import flt, now_datetime, time_diff_in_seconds
+
+from dsi_erp.dsi_erp.doctype.renewable_document.renewable_document import (
+	sync_renewable_documents_from_employee,
+)
+
+DEFAULT_CHUNK_SIZE = 500
+
+
+class RenewableDocumentBackfill(Document):
+	pass
+
+
+def start_backfill(chunk_size=DEFAULT_CHUNK_SIZE, restart=False):
+	"""
+	Re-sync renewable documents of every Employee. Resumes the latest unfinished
+	backfill unless restart is set, and queues each pending chunk as its own job
+	so queue workers process them in parallel.
+	"""
+	backfill = get_unfinished_backfill()
+	if backfill and restart:
+		backfill.db_set("status", "Cancelled")
+		backfill = None
+
+	if not backfill:
+		backfill = plan_backfill(chunk_size)
+
+	for chunk in backfill.chunks:
+		if chunk.status == "Done":
+			continue
+
+		chunk.db_set("status", "Queued", update_modified=False)
+		frappe.enqueue(
+			"dsi_erp.dsi_erp.doctype.renewable_document_backfill.renewable_document_backfill.run_backfill_chunk",
+			queue="long",
+			job_id=f"renewable_document_backfill::{chunk.name}",
+			deduplicate=True,
+			enqueue_after_commit=True,
+			backfill=backfill.name,
+			chunk=chunk.name,
+		)
+
+	if backfill.status != "Running":
+		backfill.db_set("status", "Running")
+
+	frappe.db.commit()
+	return backfill.name
+
+
+def get_unfinished_backfill():
+	name = frappe.db.get_value(
+		"Renewable Document Backfill",
+		{"status": ["in", ["Queued", "Running", "Failed"]]},
+		"name",
+		order_by="creation desc",
+	)
+	return frappe.get_doc("Renewable Document Backfill", name) if name else None
+
+
+def plan_backfill(chunk_size):
+	"""
+	Split all employees into name ranges of chunk_size employees
+	"""
+	chunk_size = max(int(chunk_size or DEFAULT_CHUNK_SIZE), 1)
+	employees = frappe.get_all("Employee", pluck="name", order_by="name")
+
+	backfill = frappe.new_doc("Renewable Document Backfill")
+	backfill.chunk_size = chunk_size
+	backfill.total_employees = len(employees)
+	backfill.started_on = now_datetime()
+
+	for start in range(0, len(employees), chunk_size):
+		names = employees[start : start + chunk_size]
+		backfill.append(
+			"chunks",
+			{"first_employee": names[0], "last_employee": names[-1], "employees": len(names)},
+		)
+
+	backfill.insert(ignore_permissions=True)
+	return backfill
+
+
+def run_backfill_chunk(backfill, chunk):
+	"""
+	Sync every employee of one chunk and checkpoint it, a chunk already done is skipped
+	"""
+	row = frappe.db.get_value(
+		"Renewable Document Backfill Chunk",
+		chunk,
+		["first_employee", "last_employee", "status"],
+		as_dict=True,
+	)
+	if not row or row.status == "Done":
+		return
+
+	started = time.monotonic()
+	try:
+		employees = frappe.get_all(
+			"Employee",
+			filters=[["name", ">=", row.first_employee], ["name", "<=", row.last_employee]],
+			pluck="name",
+			order_by="name",
+		)
+		for employee in employees:
+			sync_renewable_documents_from_employee(employee)
+
+		frappe.db.set_value(
+			"Renewable Document Backfill Chunk",
+			chunk,
+			{
+				"status": "Done",
+				"employees": len(employees),
+				"seconds": time.monotonic() - started,
+				"error": None,
+			},
+			update_modified=False,
+		)
+		frappe.db.commit()
+	except Exception:
+		frappe.db.rollback()
+		frappe.db.set_value(
+			"Renewable Document Backfill Chunk",
+			chunk,
+			{"status": "Failed", "error": frappe.get_traceback()},
+			update_modified=False,
+		)
+		frappe.db.commit()
+		update_backfill_progress(backfill)
+		raise
+
+	update_backfill_progress(backfill)
+
+
+def update_backfill_progress(backfill):
+	"""
+	Recount the finished chunks. The backfill row is locked so the last chunk
+	to finish always sees the others and closes the run.
+	"""
+	started_on = frappe.db.get_value("Renewable Document Backfill", backfill, "started_on", for_update=True)
+	chunks = frappe.get_all(
+		"Renewable Document Backfill Chunk",
+		filters={"parent": backfill, "parenttype": "Renewable Document Backfill"},
+		fields=["status", "employees"],
+	)
+
+	processed = sum(chunk.employees for chunk in chunks if chunk.status == "Done")
+	elapsed = time_diff_in_seconds(now_datetime(), started_on) if started_on else 0
+	values = {
+		"processed_employees": processed,
+		"throughput": flt(processed / elapsed, 2) if elapsed else 0,
+	}
+
+	if all(chunk.status == "Done" for chunk in chunks):
+		values.update({"status": "Completed", "finished_on": now_datetime()})
+	elif not any(chunk.status in ("Pending", "Queued") for chunk in chunks):
+		values["status"] = "Failed"
+
+	frappe.db.set_value("Renewable Document Backfill", backfill, values)
+	frappe.db.commit()
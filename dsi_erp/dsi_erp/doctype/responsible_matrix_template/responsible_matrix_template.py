@@ -4,6 +4,15 @@
 # import frappe
 from frappe.model.document import Document
 
+from dsi_erp.dsi_erp.quotation.quotation_templates import clear_template_cache
+
 
 class ResponsibleMatrixTemplate(Document):
-	pass
+	def on_update(self):
+		clear_template_cache(self.doctype, self.name)
+
+	def on_trash(self):
+		clear_template_cache(self.doctype, self.name)
+
+	def after_rename(self, old, new, merge=False):
+		clear_template_cache(self.doctype, old)
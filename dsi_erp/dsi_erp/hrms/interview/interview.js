@@ -0,0 +1,62 @@
+frappe.ui.form.on("Interview", {
+    refresh: function(frm) {
+        if (frm.doc.docstatus === 0) {
+            frm.add_custom_button(__("Find Free Slots"), function() {
+                show_free_slots(frm);
+            });
+        }
+    }
+});
+
+function show_free_slots(frm) {
+    let interviewers = (frm.doc.interview_details || [])
+        .map(row => row.interviewer)
+        .filter(Boolean);
+
+    if (!frm.doc.scheduled_on || !interviewers.length) {
+        frappe.msgprint(__("Set the scheduled date and the interviewers first."));
+        return;
+    }
+
+    // Keep the length of the interview already entered, an hour otherwise
+    let duration = 60;
+    if (frm.doc.from_time && frm.doc.to_time) {
+        duration = moment(frm.doc.to_time, "HH:mm:ss").diff(moment(frm.doc.from_time, "HH:mm:ss"), "minutes") || 60;
+    }
+
+    frappe.call({
+        method: "dsi_erp.dsi_erp.hrms.interview.scheduling.get_free_slots",
+        args: {
+            scheduled_on: frm.doc.scheduled_on,
+            interviewers: interviewers,
+            duration: duration,
+            interview: frm.is_new() ? null : frm.doc.name
+        },
+        callback: function(r) {
+            let slots = r.message || [];
+            if (!slots.length) {
+                frappe.msgprint(__("No common free slot for these interviewers on {0}.", [frappe.datetime.str_to_user(frm.doc.scheduled_on)]));
+                return;
+            }
+
+            let dialog = new frappe.ui.Dialog({
+                title: __("Free Slots"),
+                fields: [{
+                    fieldname: "slot",
+                    fieldtype: "Select",
+                    label: __("Slot"),
+                    options: slots.map(slot => `${slot.from_time} - ${slot.to_time}`),
+                    reqd: 1
+                }],
+                primary_action_label: __("Use Slot"),
+                primary_action: function(values) {
+                    let slot = slots.find(slot => `${slot.from_time} - ${slot.to_time}` === values.slot);
+                    frm.set_value("from_time", slot.from_time);
+                    frm.set_value("to_time", moment(slot.from_time, "HH:mm:ss").add(duration, "minutes").format("HH:mm:ss"));
+                    dialog.hide();
+                }
+            });
+            dialog.show();
+        }
+    });
+}
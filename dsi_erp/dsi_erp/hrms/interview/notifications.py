@@ -1,61 +1,283 @@
 import frappe
 from frappe.core.doctype.communication.email import make
+from frappe.utils import add_to_date, cint, getdate, now_datetime
+
+INTERVIEW_NOTIFICATION_TEMPLATE = "dsi_erp/templates/emails/interview_notification.html"
+INTERVIEW_REMINDER_DIGEST_TEMPLATE = "dsi_erp/templates/emails/interview_reminder_digest.html"
+
+DEFAULT_REMINDER_HOURS = [24, 2]
 
 
 @frappe.whitelist()
 def send_interview_notifications(interviews):
-    if interviews:
-        interview = frappe.get_doc("Interview", interviews)
-
-        applicant_email = None
-        interviewer_emails = []
-
-        # Get Job Applicant Email
-        if interview.job_applicant:
-            applicant_email = frappe.db.get_value(
-                "Job Applicant",
-                interview.job_applicant,
-                "email_id"
-            )
-
-        # Get Interviewer Emails
-        for interviewer in interview.interview_details:
-            if interviewer.interviewer:
-                user_email = frappe.db.get_value(
-                    "User",
-                    interviewer.interviewer,
-                    "email"
-                )
-                if user_email:
-                    interviewer_emails.append(user_email)
-
-        # Send single email with applicant in To and interviewers in CC
-        if applicant_email:
-            send_email(
-                recipient=applicant_email,
-                cc=interviewer_emails,
-                subject=f"Interview Scheduled: {interview.interview_round} at {interview.from_time}",
-                message=f"""<p>Dear Candidate,</p>
-                    <p>Your interview for the role of <strong>{interview.designation or ''}</strong> is scheduled on <strong>{frappe.format(interview.scheduled_on, dict(fieldtype="Date"))}</strong> from {interview.from_time} to {interview.to_time}.</p>
-                    <br>
-                    <p>Regards,</p>
-                    <p>HR Team</p>"""
-            )
-
-        # Return for JS display
-        return {
-            "applicant_email": applicant_email,
-            "interviewer_emails": interviewer_emails
-        }
+	if interviews:
+		interview = get_interview_notifications([interviews]).get(interviews)
+		if not interview:
+			return
+
+		# Send single email with applicant in To and interviewers in CC
+		if interview.applicant_email:
+			send_email(
+				recipient=interview.applicant_email,
+				cc=interview.interviewer_emails,
+				subject=get_interview_subject(interview),
+				message=get_interview_message(interview),
+			)
+
+		# Return for JS display
+		return {
+			"applicant_email": interview.applicant_email,
+			"interviewer_emails": interview.interviewer_emails,
+		}
+
+
+@frappe.whitelist()
+def send_bulk_interview_notifications(interviews):
+	"""
+	Queue the notification mails of many interviews, returns the background job id
+	"""
+	if isinstance(interviews, str):
+		interviews = frappe.parse_json(interviews)
+
+	if not interviews:
+		frappe.throw("Select the interviews to notify.")
+
+	frappe.has_permission("Interview", "read", throw=True)
+
+	job = frappe.enqueue(
+		"dsi_erp.dsi_erp.hrms.interview.notifications.send_interview_notification_batch",
+		timeout=len(interviews) * 10 + 300,
+		interviews=interviews,
+	)
+	return {"job_id": job.id if job else None, "count": len(interviews)}
+
+
+def send_interview_notification_batch(interviews):
+	"""
+	Background job sending one mail per interview, the applicant in To and the interviewers in CC
+	"""
+	details = get_interview_notifications(interviews)
+	sent, skipped = 0, []
+
+	for name in interviews:
+		interview = details.get(name)
+		if not interview or not interview.applicant_email:
+			skipped.append(name)
+			continue
+
+		try:
+			send_email(
+				recipient=interview.applicant_email,
+				cc=interview.interviewer_emails,
+				subject=get_interview_subject(interview),
+				message=get_interview_message(interview),
+			)
+			frappe.db.commit()
+			sent += 1
+		except Exception:
+			frappe.db.rollback()
+			frappe.log_error(title=f"Could not send interview notification for {name}")
+			skipped.append(name)
+
+	message = f"Interview mails sent for {sent} of {len(interviews)} interviews."
+	if skipped:
+		message += f" Not sent: {', '.join(skipped)}"
+	frappe.publish_realtime(
+		"msgprint",
+		{"message": message, "indicator": "orange" if skipped else "green"},
+		user=frappe.session.user,
+	)
+
+	return {"sent": sent, "skipped": skipped}
+
+
+def get_interview_notifications(interviews):
+	"""
+	Interview details with applicant and interviewer emails for many interviews,
+	read in two queries however many interviews and interviewers there are
+	"""
+	if not interviews:
+		return {}
+
+	rows = frappe.db.sql(
+		"""
+        select
+            i.name, i.job_applicant, i.interview_round, i.designation,
+            i.scheduled_on, i.from_time, i.to_time, ja.email_id as applicant_email
+        from `tabInterview` i
+        left join `tabJob Applicant` ja on ja.name = i.job_applicant
+        where i.name in %(interviews)s
+        """,
+		{"interviews": tuple(interviews)},
+		as_dict=True,
+	)
+	details = {row.name: row for row in rows}
+	for row in rows:
+		row.interviewer_emails = []
+		row.interviewers = []
+
+	interviewers = frappe.db.sql(
+		"""
+        select d.parent, d.interviewer, u.email
+        from `tabInterview Detail` d
+        join `tabUser` u on u.name = d.interviewer
+        where d.parenttype = 'Interview' and d.parent in %(interviews)s
+        order by d.parent, d.idx
+        """,
+		{"interviews": tuple(interviews)},
+		as_dict=True,
+	)
+	for row in interviewers:
+		interview = details[row.parent]
+		interview.interviewers.append(row.interviewer)
+		if row.email:
+			interview.interviewer_emails.append(row.email)
+
+	return details
+
+
+def get_interview_subject(interview):
+	return f"Interview Scheduled: {interview.interview_round} at {interview.from_time}"
+
+
+def get_interview_message(interview):
+	"""
+	Candidate mail body, rendered from a template the Jinja environment loads once per worker
+	"""
+	return frappe.render_template(
+		INTERVIEW_NOTIFICATION_TEMPLATE,
+		{
+			"interview": interview,
+			"scheduled_on": frappe.format(interview.scheduled_on, dict(fieldtype="Date")),
+		},
+	)
+
+
+def get_reminder_hours():
+	value = frappe.db.get_single_value("Dsi Erp Settings", "interview_reminder_hours")
+	hours = sorted({cint(hour) for hour in (value or "").split(",") if cint(hour) > 0}, reverse=True)
+	return hours or DEFAULT_REMINDER_HOURS
+
+
+def send_interview_reminders():
+	"""
+	Hourly job: every pending interview that entered a reminder window since its
+	last reminder gets a reminder mail to the candidate, and each interviewer gets
+	one digest of all their interviews. Sent windows are logged in Interview
+	Reminder Log, so reruns send nothing twice.
+	"""
+	reminder_hours = get_reminder_hours()
+	now = now_datetime()
+
+	# Range scan on the scheduled_on index, only interviews inside the widest window
+	upcoming = frappe.db.sql(
+		"""
+        select name, timestamp(scheduled_on, from_time) as starts_on
+        from `tabInterview`
+        where scheduled_on between %(today)s and %(horizon)s
+            and status = 'Pending' and docstatus < 2
+        """,
+		{"today": getdate(now), "horizon": getdate(add_to_date(now, hours=reminder_hours[0]))},
+		as_dict=True,
+	)
+	if not upcoming:
+		return
+
+	last_windows = dict(
+		frappe.db.sql(
+			"""
+        select interview, min(reminder_window)
+        from `tabInterview Reminder Log`
+        where interview in %(interviews)s
+        group by interview
+        """,
+			{"interviews": tuple(row.name for row in upcoming)},
+		)
+	)
+
+	due = {}
+	for row in upcoming:
+		hours_left = (row.starts_on - now).total_seconds() / 3600 if row.starts_on else -1
+		if hours_left < 0 or hours_left > reminder_hours[0]:
+			continue
+
+		window = min(hour for hour in reminder_hours if hours_left <= hour)
+		if row.name in last_windows and last_windows[row.name] <= window:
+			continue
+		due[row.name] = window
+
+	if not due:
+		return
+
+	interviews = get_interview_notifications(list(due))
+	digests = {}
+	logs = []
+	for name, window in due.items():
+		interview = interviews[name]
+		recipients = []
+
+		if interview.applicant_email:
+			frappe.sendmail(
+				recipients=[interview.applicant_email],
+				subject=f"Reminder: {get_interview_subject(interview)}",
+				message=get_interview_message(interview),
+				reference_doctype="Interview",
+				reference_name=name,
+			)
+			recipients.append(interview.applicant_email)
+
+		for email in interview.interviewer_emails:
+			digests.setdefault(email, []).append(interview)
+			recipients.append(email)
+
+		logs.append(
+			[
+				frappe.generate_hash(length=10),
+				"Administrator",
+				"Administrator",
+				now,
+				now,
+				name,
+				window,
+				now,
+				", ".join(recipients),
+			]
+		)
+
+	for email, interviewer_interviews in digests.items():
+		interviewer_interviews.sort(key=lambda interview: (interview.scheduled_on, interview.from_time))
+		frappe.sendmail(
+			recipients=[email],
+			subject=f"Upcoming interviews ({len(interviewer_interviews)})",
+			message=frappe.render_template(
+				INTERVIEW_REMINDER_DIGEST_TEMPLATE, {"interviews": interviewer_interviews}
+			),
+		)
+
+	frappe.db.bulk_insert(
+		"Interview Reminder Log",
+		[
+			"name",
+			"owner",
+			"modified_by",
+			"creation",
+			"modified",
+			"interview",
+			"reminder_window",
+			"sent_on",
+			"recipients",
+		],
+		logs,
+	)
 
 
 def send_email(recipient, subject, message, cc=None):
-    make(
-        recipients=recipient,
-        cc=", ".join(cc or []),  # convert list to string
-        subject=subject,
-        content=message,
-        content_type='html',  # ensure HTML email
-        communication_medium='Email',
-        send_email=True
-    )
+	make(
+		recipients=recipient,
+		cc=", ".join(cc or []),  # convert list to string
+		subject=subject,
+		content=message,
+		content_type="html",  # ensure HTML email
+		communication_medium="Email",
+		send_email=True,
+	)
@@ -0,0 +1,156 @@
+from bisect import bisect_left
+
+import frappe
+from frappe.utils import cint, format_time, to_timedelta
+
+DEFAULT_DAY_START = "09:00:00"
+DEFAULT_DAY_END = "18:00:00"
+DEFAULT_SLOT_MINUTES = 60
+
+
+def validate_interviewer_availability(doc, method=None):
+	"""
+	Stop an interviewer from being booked on two overlapping interviews the same day
+	"""
+	interviewers = [row.interviewer for row in doc.interview_details if row.interviewer]
+	if not (doc.scheduled_on and doc.from_time and doc.to_time and interviewers):
+		return
+
+	start, end = to_seconds(doc.from_time), to_seconds(doc.to_time)
+	bookings = get_interviewer_bookings(doc.scheduled_on, interviewers, exclude=doc.name)
+
+	conflicts = []
+	for interviewer in dict.fromkeys(interviewers):
+		conflict = find_overlap(bookings.get(interviewer), start, end)
+		if conflict:
+			conflicts.append(
+				f"{interviewer} is already booked for {conflict[2]} "
+				f"from {format_time(seconds_to_time(conflict[0]))} to {format_time(seconds_to_time(conflict[1]))}"
+			)
+
+	if conflicts:
+		frappe.throw("<br>".join(conflicts), title="Interviewer Not Available")
+
+
+@frappe.whitelist()
+def get_free_slots(
+	scheduled_on,
+	interviewers,
+	duration=DEFAULT_SLOT_MINUTES,
+	day_start=DEFAULT_DAY_START,
+	day_end=DEFAULT_DAY_END,
+	interview=None,
+):
+	"""
+	Gaps of at least duration minutes between day_start and day_end in which
+	every one of interviewers is free on scheduled_on
+	"""
+	if isinstance(interviewers, str):
+		interviewers = frappe.parse_json(interviewers)
+
+	if not scheduled_on or not interviewers:
+		return []
+
+	frappe.has_permission("Interview", "read", throw=True)
+
+	bookings = get_interviewer_bookings(scheduled_on, interviewers, exclude=interview)
+	busy = merge_intervals(
+		interval[:2]
+		for interviewer in interviewers
+		for interval in bookings.get(interviewer, {}).get("intervals", [])
+	)
+
+	duration = (cint(duration) or DEFAULT_SLOT_MINUTES) * 60
+	cursor, day_end = to_seconds(day_start), to_seconds(day_end)
+	slots = []
+	for busy_start, busy_end in [*busy, (day_end, day_end)]:
+		if min(busy_start, day_end) - cursor >= duration:
+			slots.append(
+				{"from_time": seconds_to_time(cursor), "to_time": seconds_to_time(min(busy_start, day_end))}
+			)
+		cursor = max(cursor, busy_end)
+		if cursor >= day_end:
+			break
+
+	return slots
+
+
+def get_interviewer_bookings(scheduled_on, interviewers, exclude=None):
+	"""
+	Interval index of the day's bookings per interviewer, read in one query over
+	Interview and Interview Detail. Each interviewer gets their intervals sorted
+	by start, with the starts and the running maximum of the ends kept alongside
+	so find_overlap can bisect instead of comparing every pair.
+	"""
+	rows = frappe.db.sql(
+		"""
+        select d.interviewer, i.name, i.from_time, i.to_time
+        from `tabInterview` i
+        join `tabInterview Detail` d on d.parent = i.name and d.parenttype = 'Interview'
+        where i.scheduled_on = %(scheduled_on)s
+            and d.interviewer in %(interviewers)s
+            and i.name != %(exclude)s
+            and i.docstatus < 2
+            and i.from_time is not null and i.to_time is not null
+        """,
+		{"scheduled_on": scheduled_on, "interviewers": tuple(interviewers), "exclude": exclude or ""},
+		as_dict=True,
+	)
+
+	intervals = {}
+	for row in rows:
+		intervals.setdefault(row.interviewer, []).append(
+			(to_seconds(row.from_time), to_seconds(row.to_time), row.name)
+		)
+
+	bookings = {}
+	for interviewer, interviewer_intervals in intervals.items():
+		interviewer_intervals.sort()
+		max_ends, max_end = [], 0
+		for interval in interviewer_intervals:
+			max_end = max(max_end, interval[1])
+			max_ends.append(max_end)
+
+		bookings[interviewer] = {
+			"intervals": interviewer_intervals,
+			"starts": [interval[0] for interval in interviewer_intervals],
+			"max_ends": max_ends,
+		}
+
+	return bookings
+
+
+def find_overlap(booking, start, end):
+	"""
+	A booking overlapping [start, end) as (from, to, interview), or None
+	"""
+	if not booking:
+		return None
+
+	# Only intervals starting before end can overlap, and one of them does
+	# exactly when the furthest reaching of them ends after start
+	candidates = bisect_left(booking["starts"], end)
+	if not candidates or booking["max_ends"][candidates - 1] <= start:
+		return None
+
+	for index in range(candidates - 1, -1, -1):
+		if booking["intervals"][index][1] > start:
+			return booking["intervals"][index]
+
+
+def merge_intervals(intervals):
+	merged = []
+	for start, end in sorted(intervals):
+		if merged and start <= merged[-1][1]:
+			merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+		else:
+			merged.append((start, end))
+	return merged
+
+
+def to_seconds(value):
+	return int(to_timedelta(value).total_seconds())
+
+
+def seconds_to_time(seconds):
+	return f"{seconds // 3600:02d}:{seconds % 3600 // 60:02d}:{seconds % 60:02d}"
@@ -8,13 +8,25 @@ function is_quotation_submitted(frm) {
 
 frappe.ui.form.on('Quotation', {
     refresh: function(frm) {
+        setup_cost_progress_listener(frm);
+
+        if (!frm.is_new()) {
+            frm.add_custom_button(__('What-if Costing'), function() {
+                show_costing_scenarios(frm);
+            });
+        }
+
         // Only add Update BOM Cost button if quotation is not submitted
         if (!is_quotation_submitted(frm)) {
             if (!frm.custom_buttons || !frm.custom_buttons.update_bom_cost) {
                 frm.add_custom_button(__('Update Cost'), function() {
-                    update_all_items_bom_cost(frm);
+                    if (frm.is_new()) {
+                        update_all_items_bom_cost(frm);
+                    } else {
+                        recalculate_quotation_costs(frm);
+                    }
                 });
-                
+
                 frm.custom_buttons.update_bom_cost = true;
             }
         } else {
@@ -37,21 +49,7 @@ frappe.ui.form.on('Quotation', {
             return;
         }
 
-        frappe.db.get_doc('Responsible Matrix Template', frm.doc.custom_responsibility_matrix_template)
-            .then(function(template_doc) {
-                frm.clear_table('custom_matrix_item');
-                (template_doc.table_ipvb || []).forEach(function(row) {
-                    let child = frm.add_child('custom_matrix_item');
-                    child.description = row.description;
-                    child.client_scope = row.client_scope;
-                    child.dsi_scope = row.dsi_scope;
-                    child.remarks = row.remarks;
-                });
-                frm.refresh_field('custom_matrix_item');
-            })
-            .catch(function(e){
-                frappe.msgprint(__('Failed to fetch template: {0}', [e.message || e]));
-            });
+        fill_table_from_template(frm, 'custom_responsibility_matrix_template', 'custom_matrix_item');
     },
     // Populate Prefab Building Standard and Specification from template
     custom_standard_and_specification_template: function(frm) {
@@ -66,20 +64,7 @@ frappe.ui.form.on('Quotation', {
             return;
         }
 
-        frappe.db.get_doc('Building Standard Template', frm.doc.custom_standard_and_specification_template)
-            .then(function(template_doc) {
-                frm.clear_table('custom_specification');
-                (template_doc.building_standard || []).forEach(function(row) {
-                    let child = frm.add_child('custom_specification');
-                    child.parameters = row.parameters;
-                    child.materials_specifications = row.materials_specifications;
-                    child.image = row.image;
-                });
-                frm.refresh_field('custom_specification');
-            })
-            .catch(function(e){
-                frappe.msgprint(__('Failed to fetch template: {0}', [e.message || e]));
-            });
+        fill_table_from_template(frm, 'custom_standard_and_specification_template', 'custom_specification');
     }
     // Removed custom_profit_percentage event handler as profit percentage is no longer used
 });
@@ -90,19 +75,19 @@ frappe.ui.form.on('Quotation Item', {
         if (is_quotation_submitted(frm)) {
             return;
         }
-        
+
         let item = locals[cdt][cdn];
         if (item.item_code) {
             fetch_bom_rate_for_item(frm, item);
         }
     },
-    
+
     items_add: function(frm) {
         // Only fetch BOM rate if quotation is not submitted
         if (is_quotation_submitted(frm)) {
             return;
         }
-        
+
         let new_item = frm.doc.items[frm.doc.items.length - 1];
         if (new_item.item_code) {
             fetch_bom_rate_for_item(frm, new_item);
@@ -110,6 +95,27 @@ frappe.ui.form.on('Quotation Item', {
     }
 });
 
+// Copy the rows of the selected template into the given table, rows come from the server-side template cache
+function fill_table_from_template(frm, template_field, table_field) {
+    frappe.call({
+        method: 'dsi_erp.dsi_erp.quotation.quotation_templates.get_quotation_template_rows',
+        args: {
+            fieldname: template_field,
+            template: frm.doc[template_field]
+        },
+        callback: function(r) {
+            frm.clear_table(table_field);
+            (r.message || []).forEach(function(row) {
+                frm.add_child(table_field, row);
+            });
+            frm.refresh_field(table_field);
+        },
+        error: function(e) {
+            frappe.msgprint(__('Failed to fetch template: {0}', [e.message || e]));
+        }
+    });
+}
+
 // Fetch BOM rate for single item
 function fetch_bom_rate_for_item(frm, item) {
     // Check if quotation is submitted before proceeding
@@ -117,9 +123,9 @@ function fetch_bom_rate_for_item(frm, item) {
         frappe.msgprint(__('Cannot update costs after quotation is submitted.'));
         return;
     }
-    
+
     if (!item.item_code || !frm.doc.company) return;
-    
+
     frappe.call({
         method: 'dsi_erp.dsi_erp.quotation.quotation.get_bom_rate_for_item',
         args: {
@@ -132,15 +138,15 @@ function fetch_bom_rate_for_item(frm, item) {
             if (r.message && r.message.rate) {
                 // Update the main rate field directly from BOM custom_net_cost
                 frappe.model.set_value('Quotation Item', item.name, 'rate', r.message.rate);
-                
+
                 // Set custom_cost_based_on_estimation to 1 when cost is updated from BOM
                 if (!frm.doc.custom_cost_based_on_estimation) {
                     frappe.model.set_value('Quotation', frm.doc.name, 'custom_cost_based_on_estimation', 1);
                 }
-                
+
                 // Show success message with rate
                 let message = `Rate updated from BOM: ${r.message.rate}`;
-                
+
                 frappe.show_alert({
                     message: __(message),
                     indicator: 'green'
@@ -150,143 +156,223 @@ function fetch_bom_rate_for_item(frm, item) {
     });
 }
 
-// Update all items BOM cost
-function update_all_items_bom_cost(frm) {
-    // Check if quotation is submitted before proceeding
+// Recalculate costs on the server, large quotations run in a background job
+function recalculate_quotation_costs(frm) {
     if (is_quotation_submitted(frm)) {
         frappe.msgprint(__('Cannot update costs after quotation is submitted.'));
         return;
     }
-    
-    if (!frm.doc.items || frm.doc.items.length === 0) {
-        frappe.msgprint(__('No items found in quotation.'));
-        return;
-    }
-    
-    // Using BOM custom_net_cost directly
-    
-    // Show progress
-    frm.dashboard.show_progress('Updating BOM Costs', 0, 100);
-    
-    // Collect items that have item codes
-    let valid_items = frm.doc.items.filter(item => item.item_code);
-    
-    if (valid_items.length === 0) {
-        frappe.msgprint(__('No valid items found.'));
-        frm.dashboard.hide_progress();
-        return;
-    }
-    
-    let updated_count = 0;
-    let total_items = valid_items.length;
-    
-    // Process items one by one to show progress
-    valid_items.forEach(function(item, index) {
+
+    // The server works on the saved document, so save pending edits first
+    let saved = frm.is_dirty() ? frm.save() : Promise.resolve();
+
+    saved.then(function() {
         frappe.call({
-            method: 'dsi_erp.dsi_erp.quotation.quotation.get_bom_rate_for_item',
+            method: 'dsi_erp.dsi_erp.quotation.quotation.recalculate_quotation_costs',
             args: {
-                item_code: item.item_code,
-                company: frm.doc.company,
-                quotation_name: frm.doc.name
-                // Removed current_profit_percentage as profit percentage is no longer used
+                quotation: frm.doc.name
             },
+            freeze: true,
+            freeze_message: __('Updating BOM Costs'),
             callback: function(r) {
-                if (r.message && r.message.rate) {
-                    // Update the main rate field directly from BOM custom_net_cost
-                    frappe.model.set_value('Quotation Item', item.name, 'rate', r.message.rate);
-                    
-                    updated_count++;
-                }
-                
-                // Update progress
-                let progress = Math.round((index + 1) / total_items * 100);
-                frm.dashboard.show_progress('Updating BOM Costs', progress, 100);
-                
-                // Check if all items are processed
-                if (updated_count === total_items || (index + 1) === total_items) {
-                    frm.dashboard.hide_progress();
-                    frm.refresh_field('items');
-                    
-                    if (updated_count > 0) {
-                        // Set custom_cost_based_on_estimation to 1 when costs are updated from BOM
-                        if (!frm.doc.custom_cost_based_on_estimation) {
-                            frappe.model.set_value('Quotation', frm.doc.name, 'custom_cost_based_on_estimation', 1);
-                        }
-                        
-                        let message = `Updated rates for ${updated_count} items from BOM`;
-                        frappe.msgprint(__(message));
-                    } else {
-                        frappe.msgprint(__('No BOM rates found for the items.'));
-                    }
+                if (!r.message) return;
+
+                if (r.message.queued) {
+                    frm.dashboard.show_progress(__('Updating BOM Costs'), 0, 100);
+                    frappe.show_alert({
+                        message: __('Large quotation, costs are being updated in the background'),
+                        indicator: 'blue'
+                    }, 7);
+                } else if (r.message.updated) {
+                    frm.reload_doc();
+                    frappe.msgprint(__('Updated rates for {0} items from BOM', [r.message.updated]));
+                } else {
+                    frappe.msgprint(__('No BOM rates found for the items.'));
                 }
             }
         });
     });
 }
 
-// Alternative: Batch update method for better performance
-function update_all_items_bom_cost_batch(frm) {
+// Progress of background cost updates pushed by the server
+function setup_cost_progress_listener(frm) {
+    frappe.realtime.off('quotation_cost_progress');
+    frappe.realtime.on('quotation_cost_progress', function(data) {
+        if (data.quotation !== frm.doc.name) return;
+
+        if (data.progress < 100) {
+            frm.dashboard.show_progress(__('Updating BOM Costs'), data.progress, 100, data.message);
+            return;
+        }
+
+        frm.dashboard.hide_progress(__('Updating BOM Costs'));
+        frm.reload_doc();
+        frappe.show_alert({
+            message: data.message,
+            indicator: 'green'
+        }, 5);
+    });
+}
+
+// Update all items BOM cost with a single batched request, used for unsaved quotations
+function update_all_items_bom_cost(frm) {
     // Check if quotation is submitted before proceeding
     if (is_quotation_submitted(frm)) {
         frappe.msgprint(__('Cannot update costs after quotation is submitted.'));
         return;
     }
-    
+
     if (!frm.doc.items || frm.doc.items.length === 0) {
         frappe.msgprint(__('No items found in quotation.'));
         return;
     }
-    
-    // Collect all item codes
-    let item_codes = frm.doc.items.map(item => item.item_code).filter(Boolean);
-    
+
+    // Collect all item codes, the server resolves every BOM in one query
+    let item_codes = [...new Set(frm.doc.items.map(item => item.item_code).filter(Boolean))];
+
     if (item_codes.length === 0) {
         frappe.msgprint(__('No valid items found.'));
         return;
     }
-    
-    // Show progress
-    frm.dashboard.show_progress('Updating BOM Costs', 0, 100);
-    
+
     frappe.call({
         method: 'dsi_erp.dsi_erp.quotation.quotation.get_bom_rates_for_multiple_items',
         args: {
             item_codes: item_codes,
             company: frm.doc.company
         },
+        freeze: true,
+        freeze_message: __('Updating BOM Costs'),
         callback: function(r) {
-            frm.dashboard.hide_progress();
-            
-            if (r.exc) {
-                frappe.msgprint(__('Error updating BOM costs: ') + r.exc);
-            } else if (r.message && r.message.bom_rates) {
-                // Update all items with BOM rates
-                let updated_count = 0;
-                
-                frm.doc.items.forEach(function(item) {
-                    if (r.message.bom_rates[item.item_code]) {
-                        let bom_rate = r.message.bom_rates[item.item_code];
-                        frappe.model.set_value('Quotation Item', item.name, 'bom_rate', bom_rate);
-                        
-                        // Set final rate as direct BOM cost (no profit percentage)
-                        frappe.model.set_value('Quotation Item', item.name, 'rate', bom_rate);
-                        
-                        updated_count++;
-                    }
-                });
-                
-                frm.refresh_field('items');
-                
-                if (updated_count > 0) {
-                    let message = `Updated BOM rates for ${updated_count} items (direct BOM costs, no profit margin)`;
-                    frappe.msgprint(__(message));
-                } else {
-                    frappe.msgprint(__('No BOM rates found for the items.'));
+            if (r.message && r.message.error) {
+                frappe.msgprint(__('Error updating BOM costs: {0}', [r.message.error]));
+                return;
+            }
+
+            let bom_rates = (r.message && r.message.bom_rates) || {};
+            let updated_count = 0;
+
+            frm.doc.items.forEach(function(item) {
+                let bom_rate = bom_rates[item.item_code];
+                if (bom_rate) {
+                    // Set final rate as direct BOM cost (no profit percentage)
+                    frappe.model.set_value('Quotation Item', item.name, 'rate', bom_rate);
+                    updated_count++;
                 }
+            });
+
+            frm.refresh_field('items');
+
+            if (updated_count > 0) {
+                // Set custom_cost_based_on_estimation to 1 when costs are updated from BOM
+                if (!frm.doc.custom_cost_based_on_estimation) {
+                    frappe.model.set_value('Quotation', frm.doc.name, 'custom_cost_based_on_estimation', 1);
+                }
+
+                frappe.msgprint(__('Updated rates for {0} items from BOM', [updated_count]));
+            } else {
+                frappe.msgprint(__('No BOM rates found for the items.'));
             }
-        },
-        freeze: true
+        }
     });
 }
 
 // Removed recalculate_rates_with_profit function as profit percentage is no longer used
+
+// Compare the quotation against its default BOMs and one what-if scenario,
+// costed on the server without saving anything
+function show_costing_scenarios(frm) {
+    let item_codes = [...new Set((frm.doc.items || []).map(row => row.item_code).filter(Boolean))];
+
+    let dialog = new frappe.ui.Dialog({
+        title: __('What-if Costing'),
+        size: 'extra-large',
+        fields: [
+            { fieldname: 'scenario_name', fieldtype: 'Data', label: __('Scenario'), default: __('Alternative') },
+            { fieldname: 'labour_adjustment', fieldtype: 'Percent', label: __('Labour Cost Change %') },
+            { fieldtype: 'Column Break' },
+            { fieldname: 'equipment_adjustment', fieldtype: 'Percent', label: __('Equipment Cost Change %') },
+            { fieldname: 'rate_adjustment', fieldtype: 'Percent', label: __('Rate Change %') },
+            { fieldtype: 'Section Break', label: __('Alternative BOMs') },
+            {
+                fieldname: 'boms',
+                fieldtype: 'Table',
+                in_place_edit: true,
+                fields: [
+                    {
+                        fieldname: 'item_code', fieldtype: 'Select', label: __('Item'),
+                        options: item_codes, in_list_view: 1, reqd: 1
+                    },
+                    {
+                        fieldname: 'bom', fieldtype: 'Link', label: __('BOM'), options: 'BOM', in_list_view: 1, reqd: 1,
+                        get_query: function() {
+                            return { filters: { docstatus: 1, is_active: 1 } };
+                        }
+                    }
+                ]
+            },
+            { fieldtype: 'Section Break' },
+            { fieldname: 'comparison', fieldtype: 'HTML' }
+        ],
+        primary_action_label: __('Compare'),
+        primary_action: function(values) {
+            let boms = {};
+            (values.boms || []).forEach(row => {
+                if (row.item_code && row.bom) boms[row.item_code] = row.bom;
+            });
+
+            frappe.call({
+                method: 'dsi_erp.dsi_erp.quotation.quotation_scenarios.evaluate_quotation_scenarios',
+                args: {
+                    quotation: frm.doc.name,
+                    scenarios: [
+                        { name: __('Default BOMs') },
+                        {
+                            name: values.scenario_name,
+                            boms: boms,
+                            labour_adjustment: values.labour_adjustment,
+                            equipment_adjustment: values.equipment_adjustment,
+                            rate_adjustment: values.rate_adjustment
+                        }
+                    ]
+                },
+                freeze: true,
+                callback: function(r) {
+                    if (r.message) {
+                        dialog.fields_dict.comparison.$wrapper.html(get_scenario_comparison_html(r.message));
+                    }
+                }
+            });
+        }
+    });
+    dialog.show();
+}
+
+function get_scenario_comparison_html(result) {
+    let format = value => format_currency(value, result.currency);
+    let scenarios = result.scenarios;
+
+    let header = scenarios.map(s => `<th class="text-right">${frappe.utils.escape_html(s.name)}</th>`).join('');
+    let rows = scenarios[0].rows.map((row, index) => `
+        <tr>
+            <td>${frappe.utils.escape_html(row.item_code || '')}</td>
+            <td class="text-right">${row.qty}</td>
+            ${scenarios.map(s => `<td class="text-right">${format(s.rows[index].amount)}<br>
+                <small class="text-muted">${frappe.utils.escape_html(s.rows[index].bom || '')}</small></td>`).join('')}
+        </tr>`).join('');
+
+    return `
+        <table class="table table-bordered">
+            <thead><tr><th>${__('Item')}</th><th class="text-right">${__('Qty')}</th>${header}</tr></thead>
+            <tbody>${rows}</tbody>
+            <tfoot>
+                <tr>
+                    <th colspan="2">${__('Total (current {0})', [format(result.current_total)])}</th>
+                    ${scenarios.map(s => `<th class="text-right">${format(s.total)}<br>
+                        <small class="${s.difference > 0 ? 'text-danger' : 'text-success'}">
+                            ${s.difference > 0 ? '+' : ''}${format(s.difference)} (${flt(s.difference_percent, 1)}%)
+                        </small></th>`).join('')}
+                </tr>
+            </tfoot>
+        </table>`;
+}
@@ -1,92 +1,251 @@
+import pickle
+
 import frappe
 from frappe import _
+from frappe.utils import cint, flt
+
+BOM_RATE_CACHE_KEY = "dsi_erp:quotation_bom_rate"
+
+QUOTATION_BOM_FIELDS = ["name", "item", "custom_net_cost", "quantity", "currency", "base_total_cost"]
+
+# Used while Dsi Erp Settings has no threshold configured
+DEFAULT_BACKGROUND_COST_THRESHOLD = 100
+
 
 @frappe.whitelist()
 def get_bom_rate_for_item(item_code, company, quotation_name=None, current_profit_percentage=None):
-    """
-    Get BOM rate for item based on criteria:
-    - custom_allow_in_quotation = 1
-    - is_default = 1
-    - is_active = 1
-    
-    Returns the custom_net_cost from BOM as the final rate (no profit percentage calculation)
-    """
-    try:
-        if not item_code or not company:
-            return {
-                "rate": None,
-                "message": "Item code and company are required"
-            }
-        
-        # Check if item has valid BOM
-        filters = {
-            "item": item_code,
-            "custom_allow_in_quotation": 1,
-            "is_default": 1,
-            "is_active": 1,
-            "docstatus": 1
-        }
-        
-        bom = frappe.get_value("BOM", filters, 
-                              ["custom_net_cost", "quantity", "currency"], as_dict=1)
-        
-        if bom:
-            # Calculate unit cost from BOM using custom_net_cost - this will be the final rate
-            unit_cost = bom.custom_net_cost / bom.quantity
-            
-            return {
-                "rate": unit_cost,  # Direct rate from custom_net_cost
-                "message": "BOM rate fetched successfully",
-                "bom_details": {
-                    "custom_net_cost": bom.custom_net_cost,
-                    "quantity": bom.quantity,
-                    "currency": bom.currency
-                }
-            }
-        else:
-            return {
-                "rate": None,
-                "message": "No valid BOM found for this item"
-            }
-            
-    except Exception as e:
-        frappe.log_error(f"Error fetching BOM rate for {item_code}: {str(e)}")
-        return {
-            "rate": None,
-            "error": str(e)
-        }
+	"""
+	Get BOM rate for item based on criteria:
+	- custom_allow_in_quotation = 1
+	- is_default = 1
+	- is_active = 1
+
+	Returns the custom_net_cost from BOM as the final rate (no profit percentage calculation)
+	"""
+	try:
+		if not item_code or not company:
+			return {"rate": None, "message": "Item code and company are required"}
+
+		# Check if item has valid BOM, usually answered from the cache
+		bom = get_cached_bom_rates([item_code])[item_code]
+
+		if bom.get("bom"):
+			return {
+				"rate": bom["rate"],  # Direct rate from custom_net_cost
+				"message": "BOM rate fetched successfully",
+				"bom_details": {
+					"bom": bom["bom"],
+					"custom_net_cost": bom["custom_net_cost"],
+					"quantity": bom["quantity"],
+					"currency": bom["currency"],
+				},
+			}
+		else:
+			return {"rate": None, "message": "No valid BOM found for this item"}
+
+	except Exception as e:
+		frappe.log_error(f"Error fetching BOM rate for {item_code}: {e!s}")
+		return {"rate": None, "error": str(e)}
+
 
 @frappe.whitelist()
 def get_bom_rates_for_multiple_items(item_codes, company):
-    """
-    Get BOM rates for multiple items at once
-    """
-    try:
-        if not item_codes or not company:
-            return {
-                "bom_rates": {},
-                "message": "Item codes and company are required"
-            }
-        
-        if isinstance(item_codes, str):
-            item_codes = frappe.parse_json(item_codes)
-        
-        bom_rates = {}
-        
-        for item_code in item_codes:
-            if item_code:
-                result = get_bom_rate_for_item(item_code, company)
-                if result.get("rate"):
-                    bom_rates[item_code] = result["rate"]
-        
-        return {
-            "bom_rates": bom_rates,
-            "message": f"Fetched BOM rates for {len(bom_rates)} items"
-        }
-        
-    except Exception as e:
-        frappe.log_error(f"Error fetching BOM rates for multiple items: {str(e)}")
-        return {
-            "bom_rates": {},
-            "error": str(e)
-        }
+	"""
+	Get BOM rates for multiple items at once, items missing from the cache are
+	resolved with a single BOM query
+	"""
+	try:
+		if not item_codes or not company:
+			return {"bom_rates": {}, "message": "Item codes and company are required"}
+
+		if isinstance(item_codes, str):
+			item_codes = frappe.parse_json(item_codes)
+
+		item_codes = list({item_code for item_code in item_codes if item_code})
+
+		bom_rates = {}
+		bom_names = {}
+		for item_code, bom in get_cached_bom_rates(item_codes).items():
+			if bom["rate"]:
+				bom_rates[item_code] = bom["rate"]
+				bom_names[item_code] = bom["bom"]
+
+		return {
+			"bom_rates": bom_rates,
+			"boms": bom_names,
+			"message": f"Fetched BOM rates for {len(bom_rates)} items",
+		}
+
+	except Exception as e:
+		frappe.log_error(f"Error fetching BOM rates for multiple items: {e!s}")
+		return {"bom_rates": {}, "error": str(e)}
+
+
+@frappe.whitelist()
+def recalculate_quotation_costs(quotation):
+	"""
+	Apply BOM rates to every row of a draft quotation on the server and save it
+	once. Quotations above the configured row count are handled by a background
+	job that reports progress over realtime.
+	"""
+	doc = frappe.get_doc("Quotation", quotation)
+	doc.check_permission("write")
+
+	if doc.docstatus != 0:
+		frappe.throw(_("Cannot update costs after quotation is submitted."))
+
+	threshold = (
+		cint(frappe.db.get_single_value("Dsi Erp Settings", "quotation_cost_background_threshold"))
+		or DEFAULT_BACKGROUND_COST_THRESHOLD
+	)
+
+	if len(doc.items) > threshold:
+		job = frappe.enqueue(
+			"dsi_erp.dsi_erp.quotation.quotation.apply_bom_rates_to_quotation",
+			queue="long",
+			quotation=quotation,
+			publish_progress=True,
+		)
+		return {"queued": True, "job_id": job.id if job else None}
+
+	return {"queued": False, "updated": apply_bom_rates_to_quotation(quotation)}
+
+
+def apply_bom_rates_to_quotation(quotation, publish_progress=False):
+	"""
+	Set each row's rate from its BOM with one bulk lookup, then save the
+	quotation once so totals are recalculated a single time
+	"""
+	doc = frappe.get_doc("Quotation", quotation)
+
+	def progress(percent, message, after_commit=False):
+		if publish_progress:
+			frappe.publish_realtime(
+				"quotation_cost_progress",
+				{"quotation": quotation, "progress": percent, "message": message},
+				doctype="Quotation",
+				docname=quotation,
+				after_commit=after_commit,
+			)
+
+	progress(10, _("Fetching BOM rates"))
+	item_codes = list({row.item_code for row in doc.items if row.item_code})
+	bom_rates = get_cached_bom_rates(item_codes)
+
+	updated = 0
+	for row in doc.items:
+		rate = bom_rates.get(row.item_code, {}).get("rate")
+		if rate:
+			row.rate = rate
+			updated += 1
+
+	if updated:
+		progress(50, _("Recalculating totals for {0} items").format(updated))
+		doc.custom_cost_based_on_estimation = 1
+		doc.save()
+
+	# Sent once the job commits so the form reloads the saved rates
+	progress(100, _("Updated rates for {0} items from BOM").format(updated), after_commit=True)
+	return updated
+
+
+def get_quotation_boms(item_codes, fields=None):
+	"""
+	Default, active, submitted BOMs allowed in quotations for all item_codes,
+	fetched in one query and keyed by item
+	"""
+	if not item_codes:
+		return {}
+
+	boms = frappe.get_all(
+		"BOM",
+		filters={
+			"item": ["in", item_codes],
+			"custom_allow_in_quotation": 1,
+			"is_default": 1,
+			"is_active": 1,
+			"docstatus": 1,
+		},
+		fields=fields or QUOTATION_BOM_FIELDS,
+	)
+	return {bom.item: bom for bom in boms}
+
+
+def get_bom_unit_cost(bom):
+	"""
+	Unit rate of a BOM: custom_net_cost spread over the BOM quantity
+	"""
+	if not flt(bom.quantity):
+		return None
+	return flt(bom.custom_net_cost) / flt(bom.quantity)
+
+
+def get_cached_bom_rates(item_codes):
+	"""
+	Quotation BOM rate details per item from the shared cache, read in one
+	round trip. Items not cached yet are loaded with one query and written back
+	in one round trip; items without a BOM are cached as well so they don't hit
+	the database again.
+	"""
+	item_codes = list(dict.fromkeys(item_codes))
+	if not item_codes:
+		return {}
+
+	cache = frappe.cache()
+	cache_key = cache.make_key(BOM_RATE_CACHE_KEY)
+	bom_rates = {}
+	missing = []
+
+	# Values are pickled, like RedisWrapper.hset stores them
+	for item_code, cached in zip(item_codes, cache.hmget(cache_key, item_codes), strict=True):
+		if cached is None:
+			missing.append(item_code)
+		else:
+			bom_rates[item_code] = pickle.loads(cached)
+
+	if missing:
+		boms = get_quotation_boms(missing)
+		for item_code in missing:
+			bom = boms.get(item_code)
+			if bom:
+				entry = {
+					"rate": get_bom_unit_cost(bom),
+					"bom": bom.name,
+					"custom_net_cost": bom.custom_net_cost,
+					"quantity": bom.quantity,
+					"currency": bom.currency,
+				}
+			else:
+				entry = {"rate": None, "bom": None}
+
+			bom_rates[item_code] = entry
+
+		# RedisWrapper.hset sets one field per call, the pipeline's sets them all at once
+		pipeline = cache.pipeline()
+		pipeline.hset(
+			cache_key, mapping={item_code: pickle.dumps(bom_rates[item_code]) for item_code in missing}
+		)
+		pipeline.execute()
+
+	return bom_rates
+
+
+def clear_bom_rate_cache(item_codes=None):
+	"""
+	Forget the cached rates of item_codes, or of every item
+	"""
+	if item_codes is None:
+		frappe.cache().delete_value(BOM_RATE_CACHE_KEY)
+		return
+
+	for item_code in item_codes:
+		frappe.cache().hdel(BOM_RATE_CACHE_KEY, item_code)
+
+
+def on_bom_change(doc, method):
+	"""
+	Submitting, cancelling or flipping is_default / is_active / custom_allow_in_quotation
+	on a BOM can change which BOM, and so which rate, applies to its item
+	"""
+	if doc.item:
+		clear_bom_rate_cache([doc.item])
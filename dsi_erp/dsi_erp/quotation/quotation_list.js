@@ -0,0 +1,63 @@
+// Extends erpnext's Quotation list settings with a bulk "Apply Templates" action
+
+frappe.listview_settings['Quotation'] = frappe.listview_settings['Quotation'] || {};
+
+const erpnext_quotation_list_onload = frappe.listview_settings['Quotation'].onload;
+
+frappe.listview_settings['Quotation'].onload = function(listview) {
+    if (erpnext_quotation_list_onload) {
+        erpnext_quotation_list_onload(listview);
+    }
+
+    listview.page.add_actions_menu_item(__('Apply Templates'), function() {
+        apply_templates_to_quotations(listview);
+    });
+};
+
+function apply_templates_to_quotations(listview) {
+    let quotations = listview.get_checked_items(true);
+    if (!quotations.length) {
+        frappe.msgprint(__('Select the quotations first.'));
+        return;
+    }
+
+    frappe.prompt(
+        [
+            {
+                fieldname: 'responsibility_matrix_template',
+                fieldtype: 'Link',
+                options: 'Responsible Matrix Template',
+                label: __('Responsibility Matrix Template')
+            },
+            {
+                fieldname: 'specification_template',
+                fieldtype: 'Link',
+                options: 'Building Standard Template',
+                label: __('Standard and Specification Template')
+            }
+        ],
+        function(values) {
+            frappe.call({
+                method: 'dsi_erp.dsi_erp.quotation.quotation_templates.apply_templates_to_quotations',
+                args: {
+                    quotations: quotations,
+                    responsibility_matrix_template: values.responsibility_matrix_template,
+                    specification_template: values.specification_template
+                },
+                freeze: true,
+                callback: function(r) {
+                    if (!r.message) return;
+
+                    let message = __('Templates applied to {0} quotations.', [r.message.updated]);
+                    if (r.message.skipped) {
+                        message += ' ' + __('{0} submitted or read-only quotations were skipped.', [r.message.skipped]);
+                    }
+                    frappe.msgprint(message);
+                    listview.refresh();
+                }
+            });
+        },
+        __('Apply Templates to {0} Quotations', [quotations.length]),
+        __('Apply')
+    );
+}
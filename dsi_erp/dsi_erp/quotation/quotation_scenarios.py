@@ -0,0 +1,141 @@
+import frappe
+from frappe import _
+from frappe.utils import flt
+
+from dsi_erp.dsi_erp.quotation.quotation import QUOTATION_BOM_FIELDS, get_quotation_boms
+
+# Scenarios evaluated per call, enough to compare a few alternatives side by side
+MAX_SCENARIOS = 10
+
+SCENARIO_BOM_FIELDS = [
+	*QUOTATION_BOM_FIELDS,
+	"total_cost",
+	"conversion_rate",
+	"custom_labour_cost",
+	"custom_equipment_cost",
+	"custom_profit_percentage",
+]
+
+
+@frappe.whitelist()
+def evaluate_quotation_scenarios(quotation, scenarios):
+	"""
+	Cost a quotation under several what-if scenarios without saving anything.
+	Each scenario is a dict with:
+
+	- name: label shown in the comparison
+	- boms: {item_code: BOM} to use instead of the item's default quotation BOM
+	- labour_adjustment, equipment_adjustment: % change of the BOMs' labour and equipment cost
+	- rate_adjustment: % change applied to the resulting BOM rates
+
+	All BOMs of all scenarios are read in two queries.
+	"""
+	doc = frappe.get_doc("Quotation", quotation)
+	doc.check_permission("read")
+
+	if isinstance(scenarios, str):
+		scenarios = frappe.parse_json(scenarios)
+	scenarios = [frappe._dict(scenario) for scenario in scenarios or []]
+
+	if not scenarios:
+		frappe.throw(_("Add at least one scenario."))
+	if len(scenarios) > MAX_SCENARIOS:
+		frappe.throw(_("At most {0} scenarios can be compared at once.").format(MAX_SCENARIOS))
+
+	item_codes = list({row.item_code for row in doc.items if row.item_code})
+	default_boms = get_quotation_boms(item_codes, SCENARIO_BOM_FIELDS)
+	override_boms = get_override_boms(scenarios, item_codes)
+
+	current_total = sum(flt(row.qty) * flt(row.rate) for row in doc.items)
+	results = []
+	for index, scenario in enumerate(scenarios, 1):
+		overrides = scenario.boms or {}
+		rows = []
+		for row in doc.items:
+			bom = (
+				override_boms.get(overrides[row.item_code])
+				if overrides.get(row.item_code)
+				else default_boms.get(row.item_code)
+			)
+			rate = get_scenario_rate(bom, scenario) if bom else None
+			if rate is None:
+				rate = flt(row.rate)
+
+			rows.append(
+				{
+					"item_code": row.item_code,
+					"bom": bom.name if bom else None,
+					"qty": row.qty,
+					"rate": rate,
+					"amount": flt(row.qty) * rate,
+				}
+			)
+
+		total = sum(row["amount"] for row in rows)
+		results.append(
+			{
+				"name": scenario.name or _("Scenario {0}").format(index),
+				"total": total,
+				"difference": total - current_total,
+				"difference_percent": (total - current_total) * 100 / current_total if current_total else 0,
+				"rows": rows,
+			}
+		)
+
+	return {"current_total": current_total, "currency": doc.currency, "scenarios": results}
+
+
+def get_override_boms(scenarios, item_codes):
+	"""
+	Every BOM named in any scenario, in one query. An override must be a
+	submitted, active BOM of the item it replaces.
+	"""
+	# Two scenarios may map the same BOM to different items, each pair is checked
+	requested = {
+		(bom, item_code) for scenario in scenarios for item_code, bom in (scenario.boms or {}).items() if bom
+	}
+
+	if not requested:
+		return {}
+
+	boms = {
+		bom.name: bom
+		for bom in frappe.get_all(
+			"BOM",
+			filters={
+				"name": ["in", list({bom for bom, _item_code in requested})],
+				"is_active": 1,
+				"docstatus": 1,
+			},
+			fields=SCENARIO_BOM_FIELDS,
+		)
+	}
+
+	for bom_name, item_code in sorted(requested):
+		bom = boms.get(bom_name)
+		if not bom or item_code not in item_codes or bom.item != item_code:
+			frappe.throw(
+				_("BOM {0} is not an active, submitted BOM of an item {1} in this quotation.").format(
+					bom_name, item_code
+				)
+			)
+
+	return boms
+
+
+def get_scenario_rate(bom, scenario):
+	"""
+	Unit rate of bom with the scenario's adjustments. Labour and equipment cost
+	are kept in company currency and converted to the BOM's currency here.
+	"""
+	if not flt(bom.quantity):
+		return None
+
+	conversion_rate = flt(bom.conversion_rate) or 1
+	total_cost = (
+		flt(bom.total_cost)
+		+ flt(bom.custom_labour_cost) / conversion_rate * flt(scenario.labour_adjustment) / 100
+		+ flt(bom.custom_equipment_cost) / conversion_rate * flt(scenario.equipment_adjustment) / 100
+	)
+	net_cost = total_cost * (1 + flt(bom.custom_profit_percentage) / 100)
+	return net_cost / flt(bom.quantity) * (1 + flt(scenario.rate_adjustment) / 100)
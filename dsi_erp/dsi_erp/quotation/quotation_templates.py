@@ -0,0 +1,147 @@
+import frappe
+from frappe import _
+from frappe.utils import now_datetime
+
+TEMPLATE_CACHE_KEY = "dsi_erp:quotation_template_rows"
+
+# Quotation link field -> the template it points to and the table it fills
+QUOTATION_TEMPLATES = {
+	"custom_responsibility_matrix_template": {
+		"template_doctype": "Responsible Matrix Template",
+		"template_table": "table_ipvb",
+		"table_field": "custom_matrix_item",
+		"child_doctype": "Responsibility Matrix Item",
+		"fields": ["description", "client_scope", "dsi_scope", "remarks"],
+	},
+	"custom_standard_and_specification_template": {
+		"template_doctype": "Building Standard Template",
+		"template_table": "building_standard",
+		"table_field": "custom_specification",
+		"child_doctype": "Building Standard",
+		"fields": ["parameters", "materials_specifications", "image"],
+	},
+}
+
+
+def get_template_rows(fieldname, template):
+	"""
+	Rows of a quotation template, cached until the template is saved again
+	"""
+	config = QUOTATION_TEMPLATES[fieldname]
+
+	def load_rows():
+		return frappe.get_all(
+			config["child_doctype"],
+			filters={
+				"parent": template,
+				"parenttype": config["template_doctype"],
+				"parentfield": config["template_table"],
+			},
+			fields=config["fields"],
+			order_by="idx",
+		)
+
+	return frappe.cache().hget(
+		TEMPLATE_CACHE_KEY, f"{config['template_doctype']}::{template}", generator=load_rows
+	)
+
+
+def clear_template_cache(template_doctype, template):
+	frappe.cache().hdel(TEMPLATE_CACHE_KEY, f"{template_doctype}::{template}")
+
+
+@frappe.whitelist()
+def get_quotation_template_rows(fieldname, template):
+	"""
+	Rows to copy into a quotation form when one of its template fields changes
+	"""
+	if fieldname not in QUOTATION_TEMPLATES:
+		frappe.throw(_("{0} is not a quotation template field").format(fieldname))
+
+	frappe.has_permission("Quotation", "write", throw=True)
+	return get_template_rows(fieldname, template) if template else []
+
+
+@frappe.whitelist()
+def apply_templates_to_quotations(
+	quotations, responsibility_matrix_template=None, specification_template=None
+):
+	"""
+	Replace the responsibility matrix and/or specification tables of many draft
+	quotations with a template's rows, written with one bulk insert per table
+	"""
+	if isinstance(quotations, str):
+		quotations = frappe.parse_json(quotations)
+
+	templates = {
+		"custom_responsibility_matrix_template": responsibility_matrix_template,
+		"custom_standard_and_specification_template": specification_template,
+	}
+	templates = {fieldname: template for fieldname, template in templates.items() if template}
+	if not quotations or not templates:
+		frappe.throw(_("Select the quotations and at least one template."))
+
+	drafts = [
+		name
+		for name in frappe.get_all(
+			"Quotation", filters={"name": ["in", quotations], "docstatus": 0}, pluck="name"
+		)
+		if frappe.has_permission("Quotation", "write", doc=name)
+	]
+	if not drafts:
+		frappe.throw(_("None of the selected quotations is a draft you can edit."))
+
+	now = now_datetime()
+	user = frappe.session.user
+
+	for fieldname, template in templates.items():
+		config = QUOTATION_TEMPLATES[fieldname]
+		rows = get_template_rows(fieldname, template)
+
+		frappe.db.delete(
+			config["child_doctype"],
+			{"parenttype": "Quotation", "parentfield": config["table_field"], "parent": ["in", drafts]},
+		)
+
+		values = []
+		for quotation in drafts:
+			for idx, row in enumerate(rows, start=1):
+				values.append(
+					[
+						frappe.generate_hash(length=10),
+						quotation,
+						"Quotation",
+						config["table_field"],
+						idx,
+						0,
+						user,
+						user,
+						now,
+						now,
+					]
+					+ [row.get(field) for field in config["fields"]]
+				)
+
+		if values:
+			frappe.db.bulk_insert(
+				config["child_doctype"],
+				fields=[
+					"name",
+					"parent",
+					"parenttype",
+					"parentfield",
+					"idx",
+					"docstatus",
+					"owner",
+					"modified_by",
+					"creation",
+					"modified",
+				]
+				+ config["fields"],
+				values=values,
+			)
+
+		frappe.db.set_value("Quotation", {"name": ["in", drafts]}, fieldname, template)
+
+	skipped = len(quotations) - len(drafts)
+	return {"updated": len(drafts), "skipped": skipped}
@@ -0,0 +1,73 @@
+// Copyright (c) 2026, Siva and contributors
+// For license information, please see license.txt
+
+frappe.query_reports["Expiring Documents Summary"] = {
+	filters: [
+		{
+			fieldname: "from_date",
+			label: __("From Date"),
+			fieldtype: "Date",
+			default: frappe.datetime.get_today(),
+			reqd: 1,
+		},
+		{
+			fieldname: "to_date",
+			label: __("To Date"),
+			fieldtype: "Date",
+			default: frappe.datetime.add_days(frappe.datetime.get_today(), 90),
+			reqd: 1,
+		},
+		{
+			fieldname: "group_by",
+			label: __("Group By"),
+			fieldtype: "Select",
+			options: ["Month", "Document Type", "Department"],
+			default: "Month",
+		},
+		{
+			fieldname: "department",
+			label: __("Department"),
+			fieldtype: "Link",
+			options: "Department",
+		},
+		{
+			fieldname: "top_management",
+			label: __("Top Management"),
+			fieldtype: "Select",
+			options: ["", "Exclude", "Only"],
+		},
+		{
+			fieldname: "group_value",
+			label: __("Drill Down To"),
+			fieldtype: "Data",
+			on_change: function () {
+				frappe.query_report.set_filter_value("after", "");
+			},
+		},
+		{
+			fieldname: "after",
+			label: __("After"),
+			fieldtype: "Data",
+			hidden: 1,
+		},
+		{
+			fieldname: "page_length",
+			label: __("Page Length"),
+			fieldtype: "Int",
+			default: 50,
+		},
+	],
+
+	onload: function (report) {
+		report.page.add_inner_button(__("Next Page"), function () {
+			// Keyset pagination: continue after the last document shown
+			let data = frappe.query_report.data || [];
+			let last = data[data.length - 1];
+			if (!report.get_filter_value("group_value") || !last || !last.valid_upto) {
+				frappe.show_alert(__("Drill down to a group to page through its documents"));
+				return;
+			}
+			report.set_filter_value("after", `${last.valid_upto}|${last.name}`);
+		});
+	},
+};
@@ -0,0 +1,179 @@
+# Copyright (c) 2026, Siva and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe import _
+from frappe.utils import add_days, cint, getdate, nowdate
+
+CARD_CACHE_KEY = "dsi_erp:expiring_documents_card"
+CARD_CACHE_SECONDS = 600
+CARD_DAYS = 30
+
+# Group By filter -> SQL expression the summary is grouped on
+GROUP_BY_EXPRESSIONS = {
+	"Month": "date_format(rd.valid_upto, '%%Y-%%m')",
+	"Document Type": "rd.document_name",
+	"Department": "ifnull(nullif(emp.department, ''), 'Not Set')",
+}
+
+
+def execute(filters=None):
+	filters = frappe._dict(filters or {})
+	filters.group_by = filters.group_by or "Month"
+
+	if filters.group_value is not None and filters.group_value != "":
+		return get_detail_columns(), get_detail_rows(filters)
+
+	data = get_summary_rows(filters)
+	return get_summary_columns(filters), data, None, get_chart(data)
+
+
+def get_conditions(filters):
+	conditions = ["rd.valid_upto between %(from_date)s and %(to_date)s"]
+	if filters.department:
+		conditions.append("emp.department = %(department)s")
+	if filters.top_management == "Exclude":
+		conditions.append("ifnull(emp.custom_top_level_managment, 0) = 0")
+	elif filters.top_management == "Only":
+		conditions.append("emp.custom_top_level_managment = 1")
+	return " and ".join(conditions)
+
+
+def get_values(filters):
+	today = getdate(nowdate())
+	return {
+		"from_date": filters.from_date or today,
+		"to_date": filters.to_date or add_days(today, 90),
+		"department": filters.department,
+		"group_value": filters.group_value,
+	}
+
+
+def get_summary_rows(filters):
+	"""
+	Counts per group computed by the database, only one row per group leaves it
+	"""
+	group_expression = GROUP_BY_EXPRESSIONS[filters.group_by]
+	return frappe.db.sql(
+		f"""
+		select
+			{group_expression} as group_value,
+			count(*) as documents,
+			count(distinct rd.employee) as employees,
+			sum(case when rd.valid_upto < %(today)s then 1 else 0 end) as expired,
+			min(rd.valid_upto) as first_expiry
+		from `tabRenewable Document` rd
+		left join `tabEmployee` emp on emp.name = rd.employee
+		where {get_conditions(filters)}
+		group by group_value
+		order by group_value
+		""",
+		{**get_values(filters), "today": getdate(nowdate())},
+		as_dict=True,
+	)
+
+
+def get_detail_rows(filters):
+	"""
+	One page of the documents in a group. Pages are keyset based: the After
+	filter holds "valid_upto|name" of the last row seen, so deep pages cost
+	the same as the first one.
+	"""
+	values = get_values(filters)
+	conditions = [get_conditions(filters), f"{GROUP_BY_EXPRESSIONS[filters.group_by]} = %(group_value)s"]
+
+	if filters.after:
+		after_date, _sep, after_name = filters.after.partition("|")
+		conditions.append("(rd.valid_upto, rd.name) > (%(after_date)s, %(after_name)s)")
+		values.update({"after_date": after_date, "after_name": after_name})
+
+	values["page_length"] = cint(filters.page_length) or 50
+	return frappe.db.sql(
+		f"""
+		select
+			rd.name, rd.employee, emp.employee_name, emp.department,
+			rd.document_name, rd.document_number, rd.valid_upto,
+			datediff(rd.valid_upto, curdate()) as days_left,
+			ifnull(emp.custom_top_level_managment, 0) as top_management
+		from `tabRenewable Document` rd
+		left join `tabEmployee` emp on emp.name = rd.employee
+		where {" and ".join(conditions)}
+		order by rd.valid_upto, rd.name
+		limit %(page_length)s
+		""",
+		values,
+		as_dict=True,
+	)
+
+
+def get_summary_columns(filters):
+	return [
+		{"fieldname": "group_value", "label": _(filters.group_by), "fieldtype": "Data", "width": 200},
+		{"fieldname": "documents", "label": _("Documents"), "fieldtype": "Int", "width": 120},
+		{"fieldname": "employees", "label": _("Employees"), "fieldtype": "Int", "width": 120},
+		{"fieldname": "expired", "label": _("Already Expired"), "fieldtype": "Int", "width": 130},
+		{"fieldname": "first_expiry", "label": _("First Expiry"), "fieldtype": "Date", "width": 120},
+	]
+
+
+def get_detail_columns():
+	return [
+		{
+			"fieldname": "name",
+			"label": _("Renewable Document"),
+			"fieldtype": "Link",
+			"options": "Renewable Document",
+			"width": 140,
+		},
+		{
+			"fieldname": "employee",
+			"label": _("Employee"),
+			"fieldtype": "Link",
+			"options": "Employee",
+			"width": 140,
+		},
+		{"fieldname": "employee_name", "label": _("Employee Name"), "fieldtype": "Data", "width": 180},
+		{
+			"fieldname": "department",
+			"label": _("Department"),
+			"fieldtype": "Link",
+			"options": "Department",
+			"width": 160,
+		},
+		{"fieldname": "document_name", "label": _("Document Name"), "fieldtype": "Data", "width": 150},
+		{"fieldname": "document_number", "label": _("Document Number"), "fieldtype": "Data", "width": 150},
+		{"fieldname": "valid_upto", "label": _("Valid Upto"), "fieldtype": "Date", "width": 110},
+		{"fieldname": "days_left", "label": _("Days Left"), "fieldtype": "Int", "width": 90},
+		{"fieldname": "top_management", "label": _("Top Management"), "fieldtype": "Check", "width": 120},
+	]
+
+
+def get_chart(data):
+	return {
+		"data": {
+			"labels": [row.group_value for row in data],
+			"datasets": [{"name": _("Documents"), "values": [row.documents for row in data]}],
+		},
+		"type": "bar",
+	}
+
+
+@frappe.whitelist()
+def get_expiring_documents_card(filters=None):
+	"""
+	Number card: documents expiring in the next CARD_DAYS days, cached for a few minutes
+	"""
+	value = frappe.cache().get_value(CARD_CACHE_KEY)
+	if value is None:
+		today = getdate(nowdate())
+		value = frappe.db.count(
+			"Renewable Document",
+			{"valid_upto": ["between", [today, add_days(today, CARD_DAYS)]]},
+		)
+		frappe.cache().set_value(CARD_CACHE_KEY, value, expires_in_sec=CARD_CACHE_SECONDS)
+
+	return {
+		"value": value,
+		"fieldtype": "Int",
+		"route": ["query-report", "Expiring Documents Summary"],
+	}
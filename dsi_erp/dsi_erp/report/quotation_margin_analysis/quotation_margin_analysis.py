@@ -0,0 +1,87 @@
+# Copyright (c) 2026, Siva and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe import _
+from frappe.utils import add_months, flt, getdate, nowdate
+
+# Group By filter -> SQL expression the snapshot rows are grouped on
+GROUP_BY_EXPRESSIONS = {
+	"Customer": "ifnull(nullif(customer, ''), 'Not Set')",
+	"Item Group": "ifnull(nullif(item_group, ''), 'Not Set')",
+	"Month": "date_format(transaction_date, '%%Y-%%m')",
+}
+
+
+def execute(filters=None):
+	filters = frappe._dict(filters or {})
+	filters.group_by = filters.group_by or "Customer"
+
+	data = get_data(filters)
+	return get_columns(filters), data, None, get_chart(data)
+
+
+def get_data(filters):
+	"""
+	Margins per group, summed by the database over the date range of the
+	transaction_date index, so only one row per group leaves it
+	"""
+	conditions = ["transaction_date between %(from_date)s and %(to_date)s"]
+	for fieldname in ("company", "customer", "item_group"):
+		if filters.get(fieldname):
+			conditions.append(f"{fieldname} = %({fieldname})s")
+
+	today = getdate(nowdate())
+	rows = frappe.db.sql(
+		f"""
+		select
+			{GROUP_BY_EXPRESSIONS[filters.group_by]} as group_value,
+			count(distinct quotation) as quotations,
+			sum(qty) as qty,
+			sum(base_rate * qty) as quoted_amount,
+			sum(unit_cost * qty) as estimated_cost
+		from `tabQuotation Cost Snapshot`
+		where {" and ".join(conditions)}
+		group by group_value
+		order by group_value
+		""",
+		{
+			"from_date": filters.from_date or add_months(today, -12),
+			"to_date": filters.to_date or today,
+			"company": filters.company,
+			"customer": filters.customer,
+			"item_group": filters.item_group,
+		},
+		as_dict=True,
+	)
+
+	for row in rows:
+		row.margin = flt(row.quoted_amount) - flt(row.estimated_cost)
+		row.margin_percent = row.margin * 100 / flt(row.quoted_amount) if flt(row.quoted_amount) else 0
+
+	return rows
+
+
+def get_columns(filters):
+	return [
+		{"fieldname": "group_value", "label": _(filters.group_by), "fieldtype": "Data", "width": 200},
+		{"fieldname": "quotations", "label": _("Quotations"), "fieldtype": "Int", "width": 110},
+		{"fieldname": "qty", "label": _("Qty"), "fieldtype": "Float", "width": 100},
+		{"fieldname": "quoted_amount", "label": _("Quoted Amount"), "fieldtype": "Currency", "width": 150},
+		{"fieldname": "estimated_cost", "label": _("Estimated Cost"), "fieldtype": "Currency", "width": 150},
+		{"fieldname": "margin", "label": _("Margin"), "fieldtype": "Currency", "width": 150},
+		{"fieldname": "margin_percent", "label": _("Margin %"), "fieldtype": "Percent", "width": 100},
+	]
+
+
+def get_chart(data):
+	return {
+		"data": {
+			"labels": [row.group_value for row in data],
+			"datasets": [
+				{"name": _("Quoted Amount"), "values": [row.quoted_amount for row in data]},
+				{"name": _("Estimated Cost"), "values": [row.estimated_cost for row in data]},
+			],
+		},
+		"type": "bar",
+	}
@@ -4,7 +4,7 @@ app_publisher = "Siva"
 app_description = "Dsi Erp"
 app_email = "siva@enfono.in"
 app_license = "mit"
-fixtures= ["Client Script","Print Format"]
+fixtures = ["Client Script", "Print Format"]
 # Apps
 # ------------------
 
@@ -44,12 +44,17 @@ fixtures= ["Client Script","Print Format"]
 
 # include js in doctype views
 # doctype_js = {"doctype" : "public/js/doctype.js"}
-doctype_list_js = {"Interview" : "public/js/interview_list.js"}
+doctype_list_js = {
+	"Interview": "public/js/interview_list.js",
+	"Item": "item/item_list.js",
+	"Quotation": "dsi_erp/quotation/quotation_list.js",
+}
 
 doctype_js = {
-    "BOM": "public/js/bom_items.js",
-    "Quotation": "dsi_erp/quotation/quotation.js",
-    "Item": "item/item.js"
+	"BOM": "public/js/bom_items.js",
+	"Quotation": "dsi_erp/quotation/quotation.js",
+	"Item": "item/item.js",
+	"Interview": "dsi_erp/hrms/interview/interview.js",
 }
 # doctype_tree_js = {"doctype" : "public/js/doctype_tree.js"}
 # doctype_calendar_js = {"doctype" : "public/js/doctype_calendar.js"}
@@ -91,6 +96,9 @@ doctype_js = {
 # before_install = "dsi_erp.install.before_install"
 # after_install = "dsi_erp.install.after_install"
 
+# Fixtures are imported during migrate, outside any request or job
+after_migrate = ["dsi_erp.item_helpers.release_reserved_item_codes"]
+
 # Uninstallation
 # ------------
 
@@ -130,6 +138,11 @@ doctype_js = {
 # has_permission = {
 # 	"Event": "frappe.desk.doctype.event.event.has_permission",
 # }
+permission_query_conditions = {
+	"*": "dsi_erp.restrictions.employee_restriction.get_permission_query_conditions"
+}
+
+has_permission = {"*": "dsi_erp.restrictions.employee_restriction.has_permission"}
 
 # DocType Class
 # ---------------
@@ -151,20 +164,65 @@ doctype_js = {
 # 	}
 # }
 doc_events = {
-    "*": {
-        "onload": "dsi_erp.restrictions.employee_restriction.restrict_top_level_employee_doc"
-    },
-    "Employee": {
-		"on_update": "dsi_erp.dsi_erp.doctype.renewable_document.renewable_document.on_employee_update"
+	"*": {"onload": "dsi_erp.restrictions.employee_restriction.restrict_top_level_employee_doc"},
+	"Employee": {
+		"on_update": [
+			"dsi_erp.dsi_erp.doctype.renewable_document.renewable_document.on_employee_update",
+			"dsi_erp.restrictions.employee_restriction.on_employee_change",
+		],
+		"after_rename": "dsi_erp.restrictions.employee_restriction.on_employee_rename",
+		"on_trash": "dsi_erp.restrictions.employee_restriction.on_employee_change",
+	},
+	"DocType": {"on_update": "dsi_erp.restrictions.employee_restriction.clear_employee_link_registry"},
+	"Custom Field": {
+		"on_update": "dsi_erp.restrictions.employee_restriction.clear_employee_link_registry",
+		"on_trash": "dsi_erp.restrictions.employee_restriction.clear_employee_link_registry",
+	},
+	"BOM": {
+		"before_validate": [
+			"dsi_erp.dsi_erp.bom.formula.set_formula_quantities",
+			"dsi_erp.dsi_erp.bom.bom.set_operation_time_and_rate",
+			"dsi_erp.dsi_erp.bom.dependent_items.set_dependent_quantities",
+		],
+		"validate": "dsi_erp.dsi_erp.bom.bom.set_labour_equipment_and_net_cost",
+		"on_update": "dsi_erp.dsi_erp.quotation.quotation.on_bom_change",
+		"on_submit": [
+			"dsi_erp.dsi_erp.quotation.quotation.on_bom_change",
+			"dsi_erp.dsi_erp.bom.cost_rollup.on_bom_cost_change",
+		],
+		"on_cancel": "dsi_erp.dsi_erp.quotation.quotation.on_bom_change",
+		"on_update_after_submit": [
+			"dsi_erp.dsi_erp.quotation.quotation.on_bom_change",
+			"dsi_erp.dsi_erp.bom.cost_rollup.on_bom_cost_change",
+		],
+		"on_trash": "dsi_erp.dsi_erp.quotation.quotation.on_bom_change",
+	},
+	"Quotation": {
+		"on_submit": "dsi_erp.dsi_erp.doctype.quotation_cost_snapshot.quotation_cost_snapshot.create_cost_snapshot",
+		"on_cancel": "dsi_erp.dsi_erp.doctype.quotation_cost_snapshot.quotation_cost_snapshot.delete_cost_snapshot",
+	},
+	"Item Price": {
+		"on_update": "dsi_erp.dsi_erp.bom.cost_rollup.on_item_price_change",
+		"on_trash": "dsi_erp.dsi_erp.bom.cost_rollup.on_item_price_change",
+	},
+	"Operation": {"on_update": "dsi_erp.dsi_erp.bom.bom.on_operation_update"},
+	"Item": {
+		"validate": "dsi_erp.item_helpers.validate",
+		"on_update": "dsi_erp.item_helpers.on_update",
+		"on_trash": "dsi_erp.item_helpers.on_trash",
+	},
+	"Item Group": {
+		"validate": "dsi_erp.item_helpers.validate_item_group_prefix",
+		"on_update": "dsi_erp.item_helpers.clear_item_group_prefix_cache",
+		"before_rename": "dsi_erp.item_helpers.validate_item_group_rename",
+		"after_rename": "dsi_erp.item_helpers.clear_item_group_prefix_cache",
+		"on_trash": "dsi_erp.item_helpers.clear_item_group_prefix_cache",
+	},
+	"Interview": {"validate": "dsi_erp.dsi_erp.hrms.interview.scheduling.validate_interviewer_availability"},
+	"Workflow Action": {
+		"after_insert": "dsi_erp.approvel_todo.approvel_todo.create_todo_for_approval",
+		"on_update": "dsi_erp.approvel_todo.approvel_todo.close_todo_for_approval",
 	},
-    "Item": {
-        "validate": "dsi_erp.item_helpers.validate",
-        "on_update": "dsi_erp.item_helpers.on_update"
-    },
-    "Workflow Action": {
-        "after_insert": "dsi_erp.approvel_todo.approvel_todo.create_todo_for_approval"
-    }
-
 }
 # doc_events = {
 # 	"Employee": {
@@ -200,6 +258,17 @@ doc_events = {
 # 	],
 # }
 
+scheduler_events = {
+	"daily": [
+		"dsi_erp.dsi_erp.doctype.renewable_document.renewable_document.send_expiry_reminders",
+		"dsi_erp.approvel_todo.approvel_todo.delete_closed_approval_todos",
+	],
+	"hourly": [
+		"dsi_erp.dsi_erp.hrms.interview.notifications.send_interview_reminders",
+		"dsi_erp.approvel_todo.approvel_todo.close_stale_approval_todos",
+	],
+}
+
 # Testing
 # -------
 
@@ -211,6 +280,9 @@ doc_events = {
 # override_whitelisted_methods = {
 # 	"frappe.desk.doctype.event.event.get_events": "dsi_erp.event.get_events"
 # }
+override_whitelisted_methods = {
+	"erpnext.controllers.item_variant.enqueue_multiple_variant_creation": "dsi_erp.item.item_variant.enqueue_multiple_variant_creation"
+}
 #
 # each overriding function accepts a `data` argument;
 # generated from the base implementation of the doctype dashboard,
@@ -228,15 +300,19 @@ doc_events = {
 
 # ignore_links_on_delete = ["Communication", "ToDo"]
 
+clear_cache = ["dsi_erp.restrictions.employee_restriction.clear_restriction_cache"]
+
 # Request Events
 # ----------------
 # before_request = ["dsi_erp.utils.before_request"]
 # after_request = ["dsi_erp.utils.after_request"]
+after_request = ["dsi_erp.item_helpers.release_reserved_item_codes"]
 
 # Job Events
 # ----------
 # before_job = ["dsi_erp.utils.before_job"]
 # after_job = ["dsi_erp.utils.after_job"]
+after_job = ["dsi_erp.item_helpers.release_reserved_item_codes"]
 
 # User Data Protection
 # --------------------
@@ -275,4 +351,3 @@ doc_events = {
 # default_log_clearing_doctypes = {
 # 	"Logging DocType Name": 30  # days to retain logs
 # }
-
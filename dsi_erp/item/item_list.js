@@ -0,0 +1,53 @@
+// Extends erpnext's Item list settings with a bulk "Move to Item Group" action
+
+frappe.listview_settings['Item'] = frappe.listview_settings['Item'] || {};
+
+const erpnext_item_list_onload = frappe.listview_settings['Item'].onload;
+
+frappe.listview_settings['Item'].onload = function(listview) {
+    if (erpnext_item_list_onload) {
+        erpnext_item_list_onload(listview);
+    }
+
+    listview.page.add_actions_menu_item(__('Move to Item Group'), function() {
+        move_items_to_item_group(listview);
+    });
+};
+
+function move_items_to_item_group(listview) {
+    let items = listview.get_checked_items(true);
+    if (!items.length) {
+        frappe.msgprint(__('Select the items to move first.'));
+        return;
+    }
+
+    frappe.prompt(
+        {
+            fieldname: 'item_group',
+            fieldtype: 'Link',
+            options: 'Item Group',
+            label: __('Item Group'),
+            reqd: 1
+        },
+        function(values) {
+            frappe.call({
+                method: 'dsi_erp.item_helpers.move_items_to_item_group',
+                args: {
+                    items: items,
+                    item_group: values.item_group
+                },
+                callback: function(r) {
+                    if (r.message) {
+                        frappe.show_alert({
+                            message: __('Moving {0} items to {1} in the background', [r.message.count, values.item_group]),
+                            indicator: 'blue'
+                        }, 7);
+                        listview.clear_checked_items();
+                    }
+                }
+            });
+        },
+        __('Move {0} Items', [items.length]),
+        __('Move')
+    );
+}
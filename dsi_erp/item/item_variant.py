@@ -0,0 +1,67 @@
+import json
+
+import frappe
+from erpnext.controllers.item_variant import (
+	create_variant,
+	generate_keyed_value_combinations,
+	get_variant,
+)
+from frappe import _
+
+from dsi_erp.item_helpers import assign_item_codes
+
+
+@frappe.whitelist()
+def enqueue_multiple_variant_creation(item, args, use_template_image=False):
+	"""
+	Replaces erpnext's multiple variant creation so that all variants of a
+	template get their item codes in one reservation
+	"""
+	use_template_image = frappe.parse_json(use_template_image)
+	variants = json.loads(args) if isinstance(args, str) else args
+
+	total_variants = 1
+	for key in variants:
+		total_variants *= len(variants[key])
+
+	if total_variants >= 600:
+		frappe.throw(_("Please do not create more than 500 items at a time"))
+
+	if total_variants < 10:
+		return create_multiple_variants(item, args, use_template_image)
+
+	frappe.enqueue(
+		"dsi_erp.item.item_variant.create_multiple_variants",
+		item=item,
+		args=args,
+		use_template_image=use_template_image,
+		now=frappe.flags.in_test,
+	)
+	return "queued"
+
+
+def create_multiple_variants(item, args, use_template_image=False):
+	"""
+	Build every missing variant first, assign their codes in bulk, then save them
+	"""
+	if isinstance(args, str):
+		args = json.loads(args)
+
+	template_item = frappe.get_doc("Item", item)
+	variants = []
+
+	for attribute_values in generate_keyed_value_combinations(args):
+		if get_variant(item, args=attribute_values):
+			continue
+
+		variant = create_variant(item, attribute_values)
+		if use_template_image and template_item.image:
+			variant.image = template_item.image
+		variants.append(variant)
+
+	assign_item_codes(variants)
+
+	for variant in variants:
+		variant.save()
+
+	return len(variants)
@@ -1,164 +1,499 @@
 import frappe
 
+from dsi_erp.dsi_erp.doctype.item_code_sequence.item_code_sequence import (
+	allocate_item_code,
+	peek_item_code,
+	release_item_code,
+	reserve_item_codes,
+)
+
+ITEM_GROUP_PREFIX_CACHE_KEY = "dsi_erp:item_group_prefix_map"
+
+# Codes reserved at once per prefix while a Data Import is running
+IMPORT_CODE_BLOCK_SIZE = 100
+
+# Items renamed per transaction when moving items in bulk
+REGROUP_CHUNK_SIZE = 20
+
 
 def validate(doc, method):
-    """
-    Handle item code generation in validate event for both new and existing items
-    """
-    if doc.item_group:
-        try:
-            prefix = build_prefix(doc.item_group)
-            if prefix:
-                expected_prefix = f"{prefix}-"
-                
-                # For new items, generate code (make sure it doesn't exist)
-                if doc.is_new() or not doc.item_code:
-                    doc.item_code = get_next_available_item_code(prefix)
-                    return
-                
-                # For existing items, check if item group changed and code needs update
-                if not doc.item_code.startswith(expected_prefix):
-                    new_item_code = get_next_available_item_code(prefix, doc.name)
-                    
-                    # Store the rename info in doc itself for reliability
-                    doc._rename_info = {
-                        "old_code": doc.item_code,
-                        "new_code": new_item_code
-                    }
-                    
-                    # Set the new item code
-                    doc.item_code = new_item_code
-                    
-        except Exception as e:
-            frappe.log_error(f"Error in item validation: {str(e)}", "Item Validation Error")
-
-
-def get_next_available_item_code(prefix, exclude_item_name=None):
-    """
-    Get the next available item code that definitely doesn't exist in the system
-    """
-    if not prefix:
-        prefix = "ITEM"
-    
-    # Get all existing item codes with this prefix
-    filters = [["item_code", "like", f"{prefix}-%"]]
-    existing_items = frappe.get_all(
-        "Item",
-        filters=filters,
-        fields=["name", "item_code"],
-        order_by="item_code"
-    )
-    
-    # If excluding an item, remove it from the list
-    if exclude_item_name:
-        existing_items = [item for item in existing_items if item["name"] != exclude_item_name]
-    
-    # Extract all numbers from existing item codes
-    existing_numbers = []
-    for item in existing_items:
-        item_code = item["item_code"]
-        if item_code and item_code.startswith(f"{prefix}-"):
-            try:
-                number_str = item_code.replace(f"{prefix}-", "")
-                number = int(number_str)
-                existing_numbers.append(number)
-            except ValueError:
-                continue
-    
-    # Find the first available number starting from 1
-    existing_numbers.sort()
-    next_number = 1
-    for num in existing_numbers:
-        if num == next_number:
-            next_number += 1
-        elif num > next_number:
-            break
-    
-    # Return the formatted code
-    return f"{prefix}-{str(next_number).zfill(4)}"
+	"""
+	Handle item code generation in validate event for both new and existing items
+	"""
+	if doc.item_group:
+		try:
+			prefix = build_prefix(doc.item_group)
+			if prefix:
+				expected_prefix = f"{prefix}-"
+
+				# For new items, generate code (make sure it doesn't exist)
+				if doc.is_new() or not doc.item_code:
+					if doc.flags.item_code_reserved:
+						# Code already assigned by assign_item_codes
+						return
+					if frappe.flags.in_import:
+						doc.item_code = take_reserved_item_code(prefix)
+						return
+					doc.item_code = get_next_available_item_code(prefix)
+					return
+
+				# For existing items, check if item group changed and code needs update
+				if not doc.item_code.startswith(expected_prefix):
+					new_item_code = get_next_available_item_code(prefix)
+
+					# Store the rename info in doc itself for reliability
+					doc._rename_info = {
+						"old_code": doc.item_code,
+						"new_code": new_item_code,
+						"old_item_group": frappe.db.get_value("Item", doc.name, "item_group"),
+					}
+
+					# Set the new item code
+					doc.item_code = new_item_code
+
+		except Exception as e:
+			frappe.log_error(f"Error in item validation: {e!s}", "Item Validation Error")
+
+
+def get_next_available_item_code(prefix):
+	"""
+	Allocate the next available item code for prefix from its Item Code Sequence
+	"""
+	if not prefix:
+		prefix = "ITEM"
+
+	return allocate_item_code(prefix)
+
+
+def assign_item_codes(items):
+	"""
+	Give a batch of new items their codes. Items are grouped by Item Group and
+	every prefix reserves one contiguous block, so the batch costs one sequence
+	update per prefix instead of one per item.
+	"""
+	prefix_map = get_item_group_prefix_map()
+	items_by_prefix = {}
+	for item in items:
+		prefix = prefix_map.get(item.item_group)
+		if prefix:
+			items_by_prefix.setdefault(prefix, []).append(item)
+
+	for prefix, prefix_items in items_by_prefix.items():
+		for item, item_code in zip(prefix_items, reserve_item_codes(prefix, len(prefix_items)), strict=False):
+			item.item_code = item_code
+			item.flags.item_code_reserved = True
+
+
+def take_reserved_item_code(prefix):
+	"""
+	Next code from the block reserved for prefix in this job, reserving a new
+	block of IMPORT_CODE_BLOCK_SIZE codes when it runs out
+	"""
+	reserved = frappe.flags.setdefault("reserved_item_codes", {})
+
+	while True:
+		if not reserved.get(prefix):
+			reserved[prefix] = reserve_item_codes(prefix, IMPORT_CODE_BLOCK_SIZE)
+			# A rollback before the next commit undoes the reservation, the block
+			# must not be handed out after that
+			frappe.db.after_rollback.add(lambda prefix=prefix: drop_reserved_item_codes(prefix))
+
+		item_code = reserved[prefix].pop(0)
+		# A failed import row rolls back its reservation, so recheck before handing out
+		if not frappe.db.exists("Item", item_code):
+			return item_code
+
+
+def drop_reserved_item_codes(prefix):
+	reserved = frappe.flags.get("reserved_item_codes")
+	if reserved:
+		reserved.pop(prefix, None)
+
+
+def release_reserved_item_codes(*args, **kwargs):
+	"""
+	Return codes reserved during an import but never used to their sequences.
+	Runs at the end of every request, background job and migrate, so imports
+	of any kind give their leftovers back.
+	"""
+	reserved = frappe.flags.pop("reserved_item_codes", None)
+	if not reserved:
+		return
+
+	for item_codes in reserved.values():
+		for item_code in item_codes:
+			release_item_code(item_code)
+
+	frappe.db.commit()
 
 
 def on_update(doc, method):
-    """
-    Handle renaming after the document is updated
-    """
-    if hasattr(doc, '_rename_info') and doc._rename_info:
-        rename_data = doc._rename_info
-        
-        # Double-check that the new code doesn't exist
-        if (frappe.db.exists("Item", rename_data["new_code"]) and 
-            rename_data["new_code"] != rename_data["old_code"]):
-            # If it exists, find the next available code
-            rename_data["new_code"] = get_next_available_item_code(
-                rename_data["new_code"].split("-")[0], 
-                doc.name
-            )
-            doc.item_code = rename_data["new_code"]
-        
-        try:
-            # Check if the old code still exists and new code is different
-            if (frappe.db.exists("Item", rename_data["old_code"]) and 
-                rename_data["old_code"] != rename_data["new_code"]):
-                
-                # Perform the actual rename
-                frappe.rename_doc(
-                    "Item",
-                    rename_data["old_code"],
-                    rename_data["new_code"],
-                    force=True,
-                    merge=False,
-                    show_alert=False
-                )
-                
-                frappe.msgprint(f"Item successfully renamed from {rename_data['old_code']} to {rename_data['new_code']}")
-                
-            else:
-                # Item was already renamed or codes are the same
-                frappe.msgprint(f"Item code is now: {rename_data['new_code']}")
-                
-        except frappe.LinkExistsError:
-            frappe.throw(f"Cannot rename item {rename_data['old_code']} because it has existing transactions or links.")
-        except Exception as e:
-            frappe.log_error(f"Error renaming item: {str(e)}", "Item Rename Error")
-            frappe.throw(f"Failed to rename item: {str(e)}")
+	"""
+	Queue the rename after the document is updated, renaming an item rewrites
+	every linked table and is too slow for the save request
+	"""
+	if hasattr(doc, "_rename_info") and doc._rename_info:
+		rename_data = doc._rename_info
+
+		if rename_data["old_code"] == rename_data["new_code"]:
+			frappe.msgprint(f"Item code is now: {rename_data['new_code']}")
+			return
+
+		frappe.enqueue(
+			"dsi_erp.item_helpers.rename_item_code",
+			queue="long",
+			enqueue_after_commit=True,
+			old_code=rename_data["old_code"],
+			new_code=rename_data["new_code"],
+			old_item_group=rename_data.get("old_item_group"),
+		)
+
+		frappe.msgprint(
+			f"Item {rename_data['old_code']} will be renamed to {rename_data['new_code']} in the background. "
+			"You will be notified when it is done."
+		)
+
+
+def rename_item_code(old_code, new_code, notify=True, revert_on_failure=True, old_item_group=None):
+	"""
+	Background job renaming an item to its new code. Returns the code the item ended up with.
+	When the rename fails the item keeps its old code and old_item_group, so its
+	code matches its group again, and the new number goes back to its sequence;
+	callers running in a savepoint pass revert_on_failure=False and roll back themselves.
+	"""
+	if not frappe.db.exists("Item", old_code):
+		# Item was already renamed or deleted
+		return new_code
+
+	# Double-check that the new code doesn't exist
+	if frappe.db.exists("Item", new_code):
+		taken_code = new_code
+		new_code = get_next_available_item_code(new_code.rsplit("-", 1)[0])
+		frappe.db.set_value("Item", old_code, "item_code", new_code, update_modified=False)
+		# The sequence skips codes in use, so the number is only reused once it is free
+		release_item_code(taken_code)
+
+	try:
+		frappe.rename_doc("Item", old_code, new_code, force=True, merge=False, show_alert=False)
+		release_item_code(old_code)
+
+	except Exception as e:
+		if revert_on_failure:
+			frappe.db.rollback()
+			reverted = {"item_code": old_code}
+			if old_item_group:
+				reverted["item_group"] = old_item_group
+			frappe.db.set_value("Item", old_code, reverted, update_modified=False)
+			release_item_code(new_code)
+			frappe.db.commit()
+
+		frappe.log_error(f"Error renaming item {old_code} to {new_code}: {e!s}", "Item Rename Error")
+
+		if isinstance(e, frappe.LinkExistsError):
+			message = f"Cannot rename item {old_code} because it has existing transactions or links."
+		else:
+			message = f"Failed to rename item {old_code}: {e!s}"
+		message += f" It keeps the code {old_code}"
+		message += f" and the Item Group {old_item_group}." if old_item_group else "."
+
+		if notify:
+			frappe.publish_realtime(
+				"msgprint", {"message": message, "indicator": "red"}, user=frappe.session.user
+			)
+		raise
+
+	if notify:
+		frappe.publish_realtime(
+			"msgprint",
+			{"message": f"Item successfully renamed from {old_code} to {new_code}", "indicator": "green"},
+			user=frappe.session.user,
+		)
+
+	return new_code
+
+
+@frappe.whitelist()
+def move_items_to_item_group(items, item_group):
+	"""
+	Move many items to another Item Group in a background job, renaming their codes in chunks
+	"""
+	if isinstance(items, str):
+		items = frappe.parse_json(items)
+
+	if not items or not item_group:
+		frappe.throw("Select the items and the Item Group to move them to.")
+
+	frappe.has_permission("Item", "write", throw=True)
+	# Missing items are reported by the job, only existing ones can be checked
+	not_permitted = [
+		item
+		for item in items
+		if frappe.db.exists("Item", item) and not frappe.has_permission("Item", "write", doc=item)
+	]
+	if not_permitted:
+		frappe.throw(
+			f"You are not permitted to change these items: {', '.join(not_permitted)}", frappe.PermissionError
+		)
+
+	if not build_prefix(item_group):
+		frappe.throw(f"Item Group {item_group} does not exist.")
+
+	job = frappe.enqueue(
+		"dsi_erp.item_helpers.regroup_items",
+		queue="long",
+		timeout=len(items) * 30 + 300,
+		items=items,
+		item_group=item_group,
+	)
+	return {"job_id": job.id if job else None, "count": len(items)}
+
+
+def regroup_items(items, item_group):
+	"""
+	Move items to item_group, committing every REGROUP_CHUNK_SIZE items so a
+	failure or timeout keeps the items already moved
+	"""
+	prefix = build_prefix(item_group)
+	moved, failed = 0, []
+
+	for start in range(0, len(items), REGROUP_CHUNK_SIZE):
+		chunk = items[start : start + REGROUP_CHUNK_SIZE]
+		current_codes = dict(
+			frappe.get_all(
+				"Item", filters={"name": ["in", chunk]}, fields=["name", "item_code"], as_list=True
+			)
+		)
+		to_rename = [
+			name
+			for name in chunk
+			if name in current_codes and not (current_codes[name] or "").startswith(f"{prefix}-")
+		]
+		new_codes = (
+			dict(zip(to_rename, reserve_item_codes(prefix, len(to_rename)), strict=False))
+			if to_rename
+			else {}
+		)
+
+		for name in chunk:
+			if name not in current_codes:
+				failed.append(name)
+				continue
+
+			frappe.db.savepoint("regroup_item")
+			try:
+				if name in new_codes:
+					frappe.db.set_value(
+						"Item", name, {"item_group": item_group, "item_code": new_codes[name]}
+					)
+					rename_item_code(name, new_codes[name], notify=False, revert_on_failure=False)
+				else:
+					frappe.db.set_value("Item", name, "item_group", item_group)
+				moved += 1
+			except Exception:
+				frappe.db.rollback(save_point="regroup_item")
+				if name in new_codes:
+					release_item_code(new_codes[name])
+				frappe.log_error(title=f"Could not move item {name} to {item_group}")
+				failed.append(name)
+
+		frappe.db.commit()
+		frappe.publish_progress(
+			(start + len(chunk)) * 100 / len(items),
+			title="Moving Items",
+			description=f"Moved {moved} of {len(items)} items to {item_group}",
+		)
+
+	message = f"Moved {moved} items to {item_group}."
+	if failed:
+		message += f" Could not move: {', '.join(failed)}"
+	frappe.publish_realtime(
+		"msgprint", {"message": message, "indicator": "red" if failed else "green"}, user=frappe.session.user
+	)
+
+	return {"moved": moved, "failed": failed}
+
+
+def on_trash(doc, method):
+	"""
+	Give the number of a deleted item back to its sequence
+	"""
+	release_item_code(doc.item_code or doc.name)
 
 
 def build_prefix(item_group_name):
-    """
-    Build prefix from item group hierarchy
-    """
-    if not item_group_name:
-        return ""
-    
-    try:
-        item_group = frappe.get_doc("Item Group", item_group_name)
-        current_code = (item_group.item_group_name or "").replace(" ", "")[:2].upper()
-        
-        if item_group.parent_item_group and item_group.parent_item_group != "All Item Groups":
-            parent_code = build_prefix(item_group.parent_item_group)
-            return parent_code + current_code
-        else:
-            return current_code
-            
-    except Exception as e:
-        frappe.log_error(f"Error building prefix: {str(e)}", "Build Prefix Error")
-        return ""
+	"""
+	Build prefix from item group hierarchy, read from the cached prefix map
+	"""
+	if not item_group_name:
+		return ""
+
+	try:
+		prefix_map = get_item_group_prefix_map()
+		if item_group_name in prefix_map:
+			return prefix_map[item_group_name]
+
+		# Unknown names, typed in the form, must not rebuild the whole map
+		return build_prefix_from_ancestors(item_group_name)
+
+	except Exception as e:
+		frappe.log_error(f"Error building prefix: {e!s}", "Build Prefix Error")
+		return ""
+
+
+def build_prefix_from_ancestors(item_group_name):
+	"""
+	Prefix of one Item Group from its ancestors, for groups missing from the cached map
+	"""
+	bounds = frappe.db.get_value("Item Group", item_group_name, ["lft", "rgt"])
+	if not bounds:
+		return ""
+
+	ancestors = frappe.get_all(
+		"Item Group",
+		filters={"lft": ["<=", bounds[0]], "rgt": [">=", bounds[1]]},
+		fields=["item_group_name", "parent_item_group"],
+		order_by="lft",
+	)
+	# The root adds nothing to the prefix
+	return "".join(
+		get_item_group_code(ancestor.item_group_name) for ancestor in ancestors if ancestor.parent_item_group
+	)
+
+
+def get_item_group_code(item_group_name):
+	"""
+	Two letter code an item group adds to the prefix of its children
+	"""
+	return (item_group_name or "").replace(" ", "")[:2].upper()
+
+
+def get_item_group_prefix_map():
+	"""
+	Map of every Item Group to its full item code prefix, cached until the tree changes
+	"""
+	return frappe.cache().get_value(ITEM_GROUP_PREFIX_CACHE_KEY, generator=build_item_group_prefix_map)
+
+
+def build_item_group_prefix_map():
+	"""
+	Compute all prefixes in one pass over the Item Group tree. Ordering by lft
+	visits every parent before its children, so each prefix is its parent's
+	prefix plus its own code. The root holds no items and is left out.
+	"""
+	prefix_map = {}
+	item_groups = frappe.get_all(
+		"Item Group", fields=["name", "item_group_name", "parent_item_group"], order_by="lft"
+	)
+
+	for item_group in item_groups:
+		if item_group.parent_item_group:
+			prefix_map[item_group.name] = prefix_map.get(
+				item_group.parent_item_group, ""
+			) + get_item_group_code(item_group.item_group_name)
+
+	return prefix_map
+
+
+def clear_item_group_prefix_cache(doc=None, method=None, *args):
+	"""
+	Drop the cached prefix map when an Item Group is added, renamed, moved or deleted
+	"""
+	frappe.cache().delete_value(ITEM_GROUP_PREFIX_CACHE_KEY)
+
+
+@frappe.whitelist()
+def get_item_group_prefix_collisions():
+	"""
+	Prefixes shared by more than one Item Group. Items of such groups draw their
+	codes from the same sequence.
+	"""
+	groups_by_prefix = {}
+	for item_group, prefix in get_item_group_prefix_map().items():
+		groups_by_prefix.setdefault(prefix, []).append(item_group)
+
+	return {prefix: groups for prefix, groups in groups_by_prefix.items() if len(groups) > 1}
+
+
+def validate_item_group_prefix(doc, method):
+	"""
+	Stop a new, renamed or moved Item Group from giving itself or any group
+	below it a prefix another group already uses
+	"""
+	if not (
+		doc.is_new() or doc.has_value_changed("item_group_name") or doc.has_value_changed("parent_item_group")
+	):
+		return
+
+	check_item_group_prefixes(doc, doc.item_group_name, doc.parent_item_group)
+
+
+def validate_item_group_rename(doc, method, old, new, merge=False):
+	"""
+	Renaming through Rename Document skips validate, but changes the prefix of the group and its subtree
+	"""
+	if not merge:
+		check_item_group_prefixes(doc, new, doc.parent_item_group)
+
+
+def check_item_group_prefixes(doc, item_group_name, parent_item_group):
+	prefix_map = get_item_group_prefix_map()
+
+	# The root has no prefix of its own and is never checked
+	prefix = (
+		prefix_map.get(parent_item_group, "") + get_item_group_code(item_group_name)
+		if parent_item_group
+		else ""
+	)
+
+	# Every group below doc takes its prefix from doc's new prefix
+	new_prefixes = {doc.name: (item_group_name, prefix)}
+	if not doc.is_new():
+		lft, rgt = frappe.db.get_value("Item Group", doc.name, ["lft", "rgt"])
+		descendants = frappe.get_all(
+			"Item Group",
+			filters={"lft": [">", lft], "rgt": ["<", rgt]},
+			fields=["name", "item_group_name", "parent_item_group"],
+			order_by="lft",
+		)
+		for descendant in descendants:
+			parent_prefix = new_prefixes[descendant.parent_item_group][1]
+			new_prefixes[descendant.name] = (
+				descendant.item_group_name,
+				parent_prefix + get_item_group_code(descendant.item_group_name),
+			)
+
+	groups_by_prefix = {}
+	for name, other in prefix_map.items():
+		if name not in new_prefixes:
+			groups_by_prefix.setdefault(other, []).append(name)
+
+	for group_name, group_prefix in new_prefixes.values():
+		if not group_prefix:
+			continue
+
+		clashing_groups = groups_by_prefix.get(group_prefix, [])
+		if clashing_groups:
+			frappe.throw(
+				f"Item code prefix {group_prefix} of {group_name} is already used by {', '.join(clashing_groups)}. "
+				"Items of these groups would share one code sequence, please choose a different name.",
+				title="Item Code Prefix Collision",
+			)
+		groups_by_prefix.setdefault(group_prefix, []).append(group_name)
 
 
 @frappe.whitelist()
 def get_item_code_preview(item_group, current_item=None):
-    """
-    API method to preview item code for client-side display
-    """
-    if not item_group:
-        return ""
-    
-    try:
-        prefix = build_prefix(item_group)
-        if prefix:
-            # For preview, we don't exclude current item to show what would be generated
-            code = get_next_available_item_code(prefix)
-            return code
-        return ""
-    except Exception as e:
-        frappe.throw(f"Error generating preview: {str(e)}")
\ No newline at end of file
+	"""
+	API method to preview item code for client-side display
+	"""
+	if not item_group:
+		return ""
+
+	try:
+		prefix = build_prefix(item_group)
+		if prefix:
+			# Preview only peeks at the sequence, the code is allocated on save
+			return peek_item_code(prefix)
+		return ""
+	except Exception as e:
+		frappe.throw(f"Error generating preview: {e!s}")
@@ -0,0 +1,6 @@
+import frappe
+
+
+def execute():
+	# Covers the default BOM lookup used for quotation rates
+	frappe.db.add_index("BOM", ["item", "is_default", "is_active"], "item_default_active_index")
@@ -0,0 +1,6 @@
+import frappe
+
+
+def execute():
+	# Covers the range scan of the hourly interview reminder job
+	frappe.db.add_index("Interview", ["scheduled_on", "from_time"], "scheduled_on_from_time_index")
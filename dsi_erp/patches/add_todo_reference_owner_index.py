@@ -0,0 +1,6 @@
+import frappe
+
+
+def execute():
+	# Covers the existing approval ToDo lookup of Workflow Action inserts
+	frappe.db.add_index("ToDo", ["reference_type", "reference_name", "owner"], "reference_owner_index")
@@ -0,0 +1,5 @@
+from dsi_erp.dsi_erp.doctype.item_code_sequence.item_code_sequence import seed_item_code_sequences
+
+
+def execute():
+	seed_item_code_sequences()
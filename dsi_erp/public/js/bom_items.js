@@ -1,31 +1,36 @@
+// Preview only: the server recomputes all of this when the BOM is saved
 frappe.ui.form.on("BOM Operation", {
-    base_operating_cost: function(frm, cdt, cdn) {
-        calculate_total_operation_cost(frm, cdt, cdn);
-    },
     custom_operation_type: function(frm, cdt, cdn) {
-        calculate_total_operation_cost(frm, cdt, cdn);
+        set_operation_time_and_rate(frm, cdt, cdn);
+        calculate_total_operation_cost(frm);
     },
     custom_daily_rate: function(frm, cdt, cdn) {
-        calculate_total_operation_cost(frm, cdt, cdn);
+        set_operation_time_and_rate(frm, cdt, cdn);
     },
     custom_operation_time: function(frm, cdt, cdn) {
-        calculate_total_operation_cost(frm, cdt, cdn);
+        set_operation_time_and_rate(frm, cdt, cdn);
+    },
+    // erpnext updates base_operating_cost once time_in_mins / hour_rate change
+    base_operating_cost: function(frm) {
+        calculate_total_operation_cost(frm);
     },
+    operations_remove: function(frm) {
+        calculate_total_operation_cost(frm);
+    }
 });
 
-function calculate_total_operation_cost(frm, cdt, cdn) {
+function set_operation_time_and_rate(frm, cdt, cdn) {
     let row = locals[cdt][cdn];
+    let daily_hours = flt(row.custom_daily_operation_hours);
 
-    // update child row fields
-    frappe.model.set_value(cdt, cdn, "time_in_mins",
-        (row.custom_operation_time || 0) * (row.custom_daily_operation_hours || 0) * 60
-    );
-
-    frappe.model.set_value(cdt, cdn, "hour_rate",
-        (row.custom_daily_rate || 0) / (row.custom_daily_operation_hours || 0)
-    );
+    // set_value skips unchanged values, so this does not cascade
+    frappe.model.set_value(cdt, cdn, {
+        time_in_mins: flt(row.custom_operation_time) * daily_hours * 60,
+        hour_rate: daily_hours ? flt(row.custom_daily_rate) / daily_hours : 0
+    });
+}
 
-    // now recalc totals for all operations
+function calculate_total_operation_cost(frm) {
     let lab_total = 0;
     let eq_total = 0;
 
@@ -38,8 +43,9 @@ function calculate_total_operation_cost(frm, cdt, cdn) {
         }
     });
 
-    frm.set_value("custom_labour_cost", lab_total);
-    frm.set_value("custom_equipment_cost", eq_total);
+    frm.doc.custom_labour_cost = lab_total;
+    frm.doc.custom_equipment_cost = eq_total;
+    frm.refresh_fields(["custom_labour_cost", "custom_equipment_cost"]);
 }
 
 
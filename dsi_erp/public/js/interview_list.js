@@ -1,7 +1,12 @@
 frappe.listview_settings['Interview'] = {
     hide_name_column: true,
     add_fields: ["Status"],
-    
+
+    onload(listview) {
+        listview.page.add_actions_menu_item(__('✉ Mail Selected'), function() {
+            send_bulk_interview_notifications(listview);
+        });
+    },
 
     button: {
         show(doc) {
@@ -35,3 +40,27 @@ frappe.listview_settings['Interview'] = {
         }
     }
 };
+
+function send_bulk_interview_notifications(listview) {
+    let interviews = listview.get_checked_items(true);
+    if (!interviews.length) {
+        frappe.msgprint(__('Select the interviews to mail first.'));
+        return;
+    }
+
+    frappe.call({
+        method: 'dsi_erp.dsi_erp.hrms.interview.notifications.send_bulk_interview_notifications',
+        args: {
+            interviews: interviews
+        },
+        callback: function(r) {
+            if (r.message) {
+                frappe.show_alert({
+                    message: __('Sending mails for {0} interviews in the background', [r.message.count]),
+                    indicator: 'blue'
+                }, 7);
+                listview.clear_checked_items();
+            }
+        }
+    });
+}
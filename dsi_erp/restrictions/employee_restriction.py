@@ -1,31 +1,125 @@
 import frappe
 
+TOP_LEVEL_EMPLOYEES_CACHE_KEY = "dsi_erp:top_level_employees"
+EMPLOYEE_LINK_FIELD_CACHE_KEY = "dsi_erp:employee_link_field"
+
+
 def restrict_top_level_employee_doc(doc, method=None):
-    user = frappe.session.user
+	if not is_top_level_record(doc):
+		return
+
+	if doc.doctype == "Employee":
+		frappe.throw("Access Denied: You are not authorized to access this Top Management employee.")
+	frappe.throw("Access Denied: You are not authorized to view this Top Management record.")
+
+
+def is_top_level_record(doc, user=None):
+	"""
+	True when doc is a Top Management employee, or a submitted/cancelled record
+	linked to one, and user is not a CFO
+	"""
+	# Runs on every document load, so the cheap checks come first and the
+	# common case (no Employee link) returns without touching the database
+
+	# Case 1: The document itself is Employee
+	if doc.doctype == "Employee":
+		return bool(doc.get("custom_top_level_managment")) and not is_cfo(user)
+
+	# Case 2: The document is linked to Employee
+	employee_field = get_employee_field(doc)
+	if not employee_field or doc.docstatus not in [1, 2]:
+		return False
+
+	employee_id = doc.get(employee_field)
+	if not employee_id or employee_id not in get_top_level_employees():
+		return False
+
+	return not is_cfo(user)
+
+
+def get_permission_query_conditions(user=None, doctype=None):
+	"""
+	The same rule as a SQL condition, so list views, reports, counts and exports
+	leave out Top Management records in the query itself
+	"""
+	if not doctype or is_cfo(user):
+		return ""
+
+	if doctype == "Employee":
+		return "ifnull(`tabEmployee`.`custom_top_level_managment`, 0) = 0"
+
+	employee_field = get_employee_link_field(doctype)
+	top_level_employees = get_top_level_employees() if employee_field else None
+	if not top_level_employees:
+		return ""
+
+	employees = ", ".join(frappe.db.escape(employee) for employee in sorted(top_level_employees))
+	return (
+		f"(`tab{doctype}`.`docstatus` = 0"
+		f" or ifnull(`tab{doctype}`.`{employee_field}`, '') not in ({employees}))"
+	)
 
-    user_roles = frappe.get_roles(user)
-    if "CFO" in user_roles:
-        return  # CFO can access all
 
-    # Case 1: The document itself is Employee
-    if doc.doctype == "Employee" and doc.get("custom_top_level_managment"):
-        frappe.throw("Access Denied: You are not authorized to access this Top Management employee.")
+def has_permission(doc, ptype=None, user=None, debug=False):
+	# None leaves the decision to the regular permission rules
+	if is_top_level_record(doc, user):
+		return False
+	return None
 
-    # Case 2: The document is linked to Employee
-    employee_field = get_employee_field(doc)
-    if not employee_field:
-        return
 
-    employee_id = getattr(doc, employee_field, None)
-    if not employee_id:
-        return
+def is_cfo(user=None):
+	return "CFO" in frappe.get_roles(user or frappe.session.user)  # CFO can access all
+
+
+def get_top_level_employees():
+	"""
+	Names of all Top Management employees, cached until an Employee changes
+	"""
+	return frappe.cache().get_value(
+		TOP_LEVEL_EMPLOYEES_CACHE_KEY,
+		generator=lambda: set(
+			frappe.get_all("Employee", filters={"custom_top_level_managment": 1}, pluck="name")
+		),
+	)
 
-    is_tlm = frappe.db.get_value("Employee", employee_id, "custom_top_level_managment")
-    if is_tlm and doc.docstatus in [1, 2]:
-        frappe.throw("Access Denied: You are not authorized to view this Top Management record.")
 
 def get_employee_field(doc):
-    for field in doc.meta.fields:
-        if field.fieldtype == "Link" and field.options == "Employee":
-            return field.fieldname
-    return None
\ No newline at end of file
+	return get_employee_link_field(doc.doctype)
+
+
+def get_employee_link_field(doctype):
+	"""
+	First Link to Employee on doctype, or "" if it has none. Worked out once per
+	doctype and kept in a registry until doctypes or custom fields change.
+	"""
+	return frappe.cache().hget(
+		EMPLOYEE_LINK_FIELD_CACHE_KEY,
+		doctype,
+		generator=lambda: find_employee_field(frappe.get_meta(doctype)),
+	)
+
+
+def find_employee_field(meta):
+	for field in meta.fields:
+		if field.fieldtype == "Link" and field.options == "Employee":
+			return field.fieldname
+	return ""
+
+
+def on_employee_change(doc, method=None):
+	if method != "on_update" or doc.has_value_changed("custom_top_level_managment"):
+		frappe.cache().delete_value(TOP_LEVEL_EMPLOYEES_CACHE_KEY)
+
+
+def on_employee_rename(doc, method, old, new, merge=False):
+	# The cached names of Top Management employees still hold the old name
+	clear_restriction_cache()
+
+
+def clear_employee_link_registry(doc=None, method=None):
+	frappe.cache().delete_value(EMPLOYEE_LINK_FIELD_CACHE_KEY)
+
+
+def clear_restriction_cache():
+	frappe.cache().delete_value(TOP_LEVEL_EMPLOYEES_CACHE_KEY)
+	clear_employee_link_registry()